@@ -4,13 +4,19 @@ Agents module containing LLM/AI functionality for the campaign assistant.
 Includes chatbot logic, token tracking, and conversation management.
 """
 
-from .chatbot import chat_query, chat_query_with_custom_agent, clear_memory, get_memory_stats
+from .chatbot import (
+    chat_query, chat_query_async, chat_query_stream, chat_query_with_custom_agent, clear_memory, get_memory_stats,
+    close_async_app
+)
 from .token_tracking import TokenTracker
 
 __all__ = [
     'chat_query',
+    'chat_query_async',
+    'chat_query_stream',
     'chat_query_with_custom_agent', 
     'clear_memory',
+    'close_async_app',
     'get_memory_stats',
     'TokenTracker'
 ]
@@ -0,0 +1,51 @@
+# _db.py
+"""
+SQLite connections for the conversations database.
+Opens tuned connections and hands out one per thread, so token tracking,
+memory and cache reads do not serialize on a single shared connection.
+"""
+
+import sqlite3
+import threading
+from typing import Callable, Union
+
+from databases.sqlite_config import SQLiteConfig
+
+# Applied to every connection; journal_mode is persistent, the rest are per-connection
+_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
+    PRAGMA cache_size=-65536;
+"""
+
+_local = threading.local()
+
+# Either a shared connection or a factory returning the caller's connection
+ConnectionSource = Union[sqlite3.Connection, Callable[[], sqlite3.Connection]]
+
+
+def connect(db_path: str = None) -> sqlite3.Connection:
+    """Open a new tuned connection to the conversations database."""
+    conn = sqlite3.connect(
+        db_path or SQLiteConfig.get_conversations_db(), check_same_thread=False
+    )
+    conn.executescript(_PRAGMAS)
+    return conn
+
+
+def get_conn() -> sqlite3.Connection:
+    """Return this thread's connection to the conversations database, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = connect()
+        _local.conn = conn
+    return conn
+
+
+def as_connection_factory(source: ConnectionSource) -> Callable[[], sqlite3.Connection]:
+    """Normalize a connection or a connection factory into a factory."""
+    if isinstance(source, sqlite3.Connection):
+        return lambda: source
+    return source
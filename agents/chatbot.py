@@ -3,23 +3,28 @@ from langchain_openai import ChatOpenAI
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage, SystemMessage
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.sqlite import SqliteSaver
-from typing import TypedDict, Annotated, Sequence, Optional, Dict, Any
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from typing import TypedDict, Annotated, Sequence, Optional, Dict, Any, List, NamedTuple, Tuple, AsyncIterator
 from loguru import logger
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from .llm_tools import LLM_TOOLS
+import aiosqlite
+import orjson
+from .llm_tools import LLM_TOOLS, hf_embeddings
 from .token_tracking import TokenTracker
+from .response_cache import ResponseCache
+from ._db import connect, get_conn
 from .util_memory import MemoryManager, load_conversation_history
-from .util_deepseek import (
-    parse_deepseek_tool_calls,
-    clean_deepseek_content,
-    process_deepseek_response
-)
+from .util_deepseek import inspect_content, process_deepseek_response
+from .util_offtopic import OffTopicClassifier, OFFTOPIC_MESSAGE
 from databases.sqlite_config import SQLiteConfig
 import os
-import ast
-import sqlite3
+import asyncio
+import operator
 import sys
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to path for centralized logging
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -91,9 +96,39 @@ class ChatbotResponse(BaseModel):
         return result
 
 
-# Configuration: Choose between OpenAI and LM Studio
+# Plain-dict factories with the same shape as ChatbotResponse.to_dict(), used on
+# the per-request path so responses skip Pydantic validation
+def _text_response(message: str, source: Optional[str] = None) -> Dict[str, Any]:
+    """Build a text response dict."""
+    if source:
+        return {"type": "text", "message": message, "source": source}
+    return {"type": "text", "message": message}
+
+
+def _data_response(response_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a table, chart or image response dict."""
+    return {"type": response_type, "message": "Here are the results", "data": data}
+
+
+_ERROR_RESPONSE: Dict[str, Any] = ChatbotResponse.create_error_response(
+    message=(
+        "I couldn't find relevant campaign information for your "
+        "question. Please try rephrasing or ask about a specific "
+        "campaign, metric, topic or segment!"
+    )
+).to_dict()
+
+
+# Configuration: Choose between OpenAI, LM Studio and AWS Bedrock
 USE_LOCAL_LLM = os.getenv("USE_LOCAL_LLM", "false").lower() == "true"
 LM_STUDIO_URL = os.getenv("LM_STUDIO_URL", "http://localhost:1234")
+USE_BEDROCK = os.getenv("USE_BEDROCK", "false").lower() == "true"
+BEDROCK_MODEL_ID = os.getenv("BEDROCK_MODEL_ID", "us.anthropic.claude-3-5-haiku-20241022-v1:0")
+
+# Generation limits: capped answers bound worst-case latency and spend per turn,
+# and a fixed seed keeps repeated questions reproducible for the response cache
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "512"))
+LLM_SEED = int(os.getenv("LLM_SEED", "0"))
 
 # LangSmith Configuration
 if os.getenv("LANGCHAIN_TRACING_V2").lower() == "true":
@@ -112,50 +147,624 @@ if USE_LOCAL_LLM:
         base_url=f"{LM_STUDIO_URL}/v1",
         api_key="not-needed",  # LM Studio doesn't require API key
         temperature=0,
+        max_tokens=LLM_MAX_TOKENS,
+        seed=LLM_SEED,
         model="local-model"  # This can be any name since LM Studio ignores it
     )
+elif USE_BEDROCK:
+    # Optional dependency, only needed for the Bedrock deployment
+    from langchain_aws import ChatBedrockConverse
+
+    logger.info(f"Using AWS Bedrock ({BEDROCK_MODEL_ID})")
+    llm = ChatBedrockConverse(
+        model=BEDROCK_MODEL_ID,
+        temperature=0,
+        max_tokens=LLM_MAX_TOKENS,
+        performance_config={"latency": "optimized"}  # latency-optimized inference
+    )
 else:
     logger.info("Using OpenAI")
     llm = ChatOpenAI(
         temperature=0,
-        model="gpt-3.5-turbo"  # or any other OpenAI model
+        model="gpt-3.5-turbo",  # or any other OpenAI model
+        max_tokens=LLM_MAX_TOKENS,
+        seed=LLM_SEED,
+        streaming=True,
+        stream_usage=True  # keep token usage when the agent is streamed
     )
 
+LLM_MODEL_NAME = getattr(llm, "model_name", None) or getattr(llm, "model_id", "")
+
 # LangGraph checkpointer
+# The checkpointer serializes on its own connection; everything else gets a
+# per-thread connection so reads are not queued behind checkpoint writes (WAL)
 db_path = SQLiteConfig.get_conversations_db()
-conn = sqlite3.connect(db_path, check_same_thread=False)
+conn = connect(db_path)
 checkpointer = SqliteSaver(conn)
 
 # Initialize token tracker
-token_tracker = TokenTracker(conn)
+token_tracker = TokenTracker(get_conn)
 
 # Initialize memory manager
-memory_manager = MemoryManager(checkpointer, conn)
+memory_manager = MemoryManager(checkpointer, get_conn)
+
+# Initialize response cache (semantic lookups reuse the local MiniLM embeddings)
+response_cache = ResponseCache(get_conn, embed_fn=hf_embeddings.embed_query)
+
+# Off-topic gate shares the cache's query embedding, so it costs one matrix product
+offtopic_gate = OffTopicClassifier(hf_embeddings)
+
+
+# Static priming prefix, identical bytes on every request so the provider's
+# prompt cache can reuse it. All variable content (history, query) goes after it.
+PRIMING_MESSAGES: Tuple[BaseMessage, ...] = (
+    SystemMessage(content=(
+        "You are ONLY a Campaign Analytics Assistant. "
+        "You MUST reject ANY non-campaign queries immediately. "
+        "You are a Campaign Performance Assistant with a strict focus on campaign analytics data. "
+        "Your responses MUST be based ONLY on: "
+        "1. Information from previous conversations in our chat history "
+        "2. Data retrieved through campaign data tools "
+        "3. Direct campaign performance metrics and analytics "
+        
+        "STRICT RULES: "
+        "- NEVER create, invent, or make up any information "
+        "- NEVER tell jokes or engage in casual conversation "
+        "- NEVER provide responses about topics outside of campaign performance "
+        "- If information is not in the chat history or available through tools, respond ONLY with: 'I can only provide information about campaign performance based on available data.' "
+        
+        "WORKFLOW: "
+        "1. First, check conversation history for relevant information "
+        "2. If history doesn't contain the answer, use campaign data tools "
+        "3. If neither source has the information, provide the standard response "
+        
+        "Remember: You are an analytics tool, not a conversational AI. "
+        "Stay focused only on campaign performance data and metrics."
+    )),
+    # Prime with example exchange
+    HumanMessage(content="Tell me a joke"),
+    AIMessage(content=(
+        "I am a Campaign Analytics Assistant. I can only provide "
+        "information about campaign performance data."
+    )),
+    HumanMessage(content="How are you today?"),
+    AIMessage(content=(
+        "I am a Campaign Analytics Assistant. I can only provide "
+        "information about campaign performance data."
+    )),
+)
 
 
 def message_reducer(existing: Sequence[BaseMessage], new: Sequence[BaseMessage]) -> Sequence[BaseMessage]:
     """Keep only the last n messages to prevent unlimited growth."""
+    n = 10
 
-    # Combine existing and new messages
-    all_messages = list(existing) + list(new)
+    # Slice the window directly instead of concatenating the full histories
+    if len(new) >= n:
+        window = list(new[-n:])
+    else:
+        window = list(existing[-(n - len(new)):]) + list(new)
 
-    # Keep only the last n messages
-    n = 10
-    last_n_messages = all_messages[-n:]
-    valid_messages = []
-    add_all_the_rest = False
-    for msg in last_n_messages:
-        if isinstance(msg, HumanMessage) or add_all_the_rest: # If it's a human message or we already decided to add all
-            add_all_the_rest = True
-            valid_messages.append(msg)
-    
-    return valid_messages
+    # Start the window at its first human message so it never opens on a tool result
+    human = HumanMessage
+    for i, msg in enumerate(window):
+        if isinstance(msg, human):
+            return window[i:]
+    return []
 
 
 # Define the state for the agent
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], message_reducer]
     data: dict
+    # Token counters accumulate across nodes (and turns, via the checkpointer)
+    input_tokens: Annotated[int, operator.add]
+    output_tokens: Annotated[int, operator.add]
+    cached_tokens: Annotated[int, operator.add]
+    # Set by call_tools: {"meaningful": bool, "source": str}, reset every turn
+    last_tool_meta: dict
+
+
+# Tools are bound once at import time and shared by every query
+MAX_TOOL_WORKERS = 8  # Upper bound on tool calls executed concurrently
+all_tools = LLM_TOOLS
+tools_dict = {tool.name: tool for tool in all_tools}
+llm_with_tools = llm.bind_tools(all_tools)
+
+
+# Define the agent node with Deepseek tool call parsing
+def call_model(state: AgentState, config: RunnableConfig):
+    messages = state["messages"]
+
+    configurable = config.get("configurable", {})
+    user_id = configurable.get("user_id")
+    thread_id = configurable.get("thread_id")
+    
+    # Log conversation context for debugging (lazy: only formatted when DEBUG is enabled)
+    logger.debug(
+        "call_model() - Processing {} messages for User: {}, Thread: {}",
+        len(messages), user_id, thread_id
+    )
+    logger.opt(lazy=True).debug(
+        "Message types: {}", lambda: [type(msg).__name__ for msg in messages]
+    )
+    logger.opt(lazy=True).debug("Data: {}", lambda: state.get("data", {}))
+    
+    # Passing config through lets astream_events stream tokens from this call
+    response = llm_with_tools.invoke([*PRIMING_MESSAGES, *messages], config)
+    
+    # Simple token tracking - extract from response if available
+    input_tokens = output_tokens = cached_tokens = 0
+    if hasattr(response, 'usage_metadata') and response.usage_metadata:
+        usage = response.usage_metadata
+        input_tokens = usage.get('input_tokens', 0)
+        output_tokens = usage.get('output_tokens', 0)
+        cached_tokens = (usage.get('input_token_details') or {}).get('cache_read', 0)
+    if not cached_tokens:
+        # Fall back to the raw OpenAI usage block
+        token_usage = getattr(response, 'response_metadata', {}).get('token_usage') or {}
+        cached_tokens = (token_usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0
+    logger.debug(
+        "Tokens - Input: {}, Output: {}, Cached: {}",
+        input_tokens, output_tokens, cached_tokens
+    )
+    
+    # Normalize Deepseek's custom tool call format and thinking blocks after reading
+    # usage, since the rebuilt message has no usage metadata. One scan finds every
+    # marker and is shared with the parser and cleaner.
+    if isinstance(response.content, str):
+        content_info = inspect_content(response.content)
+        if content_info.has_markers:
+            response = process_deepseek_response(response, content_info)
+
+    return {
+        "messages": [response],
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cached_tokens": cached_tokens
+    }
+
+
+def _is_meaningful(structured: Optional[Dict[str, Any]]) -> bool:
+    """Whether a structured tool payload carries data (tools flag empty and error results)."""
+    return (
+        isinstance(structured, dict)
+        and not structured.get("empty")
+        and not structured.get("error")
+    )
+
+
+def _tool_error_message(tool_call: Dict[str, Any], content: str) -> ToolMessage:
+    """Build the ToolMessage reported back to the model for a failed tool call."""
+    return ToolMessage(
+        content=content,
+        name=tool_call["name"],
+        tool_call_id=tool_call["id"],
+        additional_kwargs={"structured": {"error": True}}
+    )
+
+
+def _tool_result_message(tool_call: Dict[str, Any], response: Any) -> ToolMessage:
+    """Wrap a tool result in a ToolMessage."""
+    # Keep the tool's dict on the message so post-processing never re-parses it
+    if isinstance(response, dict):
+        return ToolMessage(
+            content=orjson.dumps(response, default=str).decode(),
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"],
+            additional_kwargs={"structured": response}
+        )
+    return ToolMessage(
+        content=str(response),
+        name=tool_call["name"],
+        tool_call_id=tool_call["id"]
+    )
+
+
+def _execute_tool_call(tool_call: Dict[str, Any]) -> Tuple[ToolMessage, Any]:
+    """Run one tool call and wrap its result in a ToolMessage; errors become error messages."""
+    tool_name = tool_call["name"]
+    if tool_name not in tools_dict:
+        return _tool_error_message(tool_call, f"Unknown tool: {tool_name}"), None
+
+    try:
+        response = tools_dict[tool_name].invoke(tool_call["args"])
+        return _tool_result_message(tool_call, response), response
+    except Exception as e:
+        return _tool_error_message(tool_call, f"Error executing tool {tool_name}: {str(e)}"), None
+
+
+async def _aexecute_tool_call(tool_call: Dict[str, Any]) -> Tuple[ToolMessage, Any]:
+    """Async variant of _execute_tool_call; tools without a coroutine run in a worker thread."""
+    tool_name = tool_call["name"]
+    if tool_name not in tools_dict:
+        return _tool_error_message(tool_call, f"Unknown tool: {tool_name}"), None
+
+    try:
+        response = await tools_dict[tool_name].ainvoke(tool_call["args"])
+        return _tool_result_message(tool_call, response), response
+    except Exception as e:
+        return _tool_error_message(tool_call, f"Error executing tool {tool_name}: {str(e)}"), None
+
+
+def _collect_tool_results(state: AgentState, results: List[Tuple[ToolMessage, Any]]) -> Dict[str, Any]:
+    """Turn ordered tool results into the tools node's state update."""
+    data = state.get("data", {})
+    tool_meta = state.get("last_tool_meta") or {}
+
+    tool_messages = []
+    for tool_message, response in results:
+        tool_messages.append(tool_message)
+
+        if isinstance(response, dict) and response.get('type') in ['table']:
+            logger.debug("response: is table")
+            data = response
+
+        if isinstance(response, dict) and response.get('type') in ['chart']:
+            logger.debug("response: is chart")
+            data = response
+
+        if isinstance(response, dict) and response.get('type') in ['image']:
+            logger.debug("response: is image")
+            image_url = response.get("image_url", "")
+            if image_url:
+                data = response
+
+    # Summarize this turn's tool results once, keeping an earlier meaningful round
+    if not tool_meta.get("meaningful"):
+        tool_meta = {"meaningful": False, "source": None}
+        for tool_message in tool_messages:
+            structured = tool_message.additional_kwargs.get("structured")
+            if _is_meaningful(structured):
+                tool_meta = {"meaningful": True, "source": structured.get("source")}
+                break
+    
+    return {
+        "messages": tool_messages,
+        "data": data,
+        "last_tool_meta": tool_meta
+    }
+
+
+# Define the tool execution node
+def call_tools(state: AgentState, config: RunnableConfig):
+    logger.debug("call_tools() - Thread: {}", config.get("configurable", {}).get("thread_id"))
+    tool_calls = state["messages"][-1].tool_calls
+
+    # Independent tool calls (API requests, vector search) run concurrently;
+    # results keep the order of the model's tool calls
+    if len(tool_calls) > 1:
+        with ThreadPoolExecutor(max_workers=min(MAX_TOOL_WORKERS, len(tool_calls))) as executor:
+            results = list(executor.map(_execute_tool_call, tool_calls))
+    else:
+        results = [_execute_tool_call(tool_call) for tool_call in tool_calls]
+
+    return _collect_tool_results(state, results)
+
+
+# Async tool node used by ainvoke/astream_events: API tools await a shared
+# httpx.AsyncClient and all calls of a step are gathered on the event loop
+async def acall_tools(state: AgentState, config: RunnableConfig):
+    logger.debug("acall_tools() - Thread: {}", config.get("configurable", {}).get("thread_id"))
+    tool_calls = state["messages"][-1].tool_calls
+    results = await asyncio.gather(*(_aexecute_tool_call(tool_call) for tool_call in tool_calls))
+    return _collect_tool_results(state, list(results))
+
+
+# Define the condition to decide next step
+def should_continue(state: AgentState):
+    messages = state["messages"]
+    last_message = messages[-1]
+    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
+        return "tools"
+    return END
+
+
+# Create the graph
+workflow = StateGraph(AgentState)
+
+# Add nodes
+workflow.add_node("agent", call_model)
+workflow.add_node("tools", RunnableLambda(call_tools, afunc=acall_tools))
+
+# Set entry point
+workflow.set_entry_point("agent")
+
+# Add conditional edges
+workflow.add_conditional_edges(
+    "agent",
+    should_continue,
+    {
+        "tools": "tools",
+        END: END
+    }
+)
+
+# Add edge from tools back to agent
+workflow.add_edge("tools", "agent")
+
+# Compile the graph once with SQLite checkpointer
+APP = workflow.compile(checkpointer=checkpointer)
+
+# Async callers get their own compiled graph per event loop, since the
+# aiosqlite connection behind AsyncSqliteSaver is bound to the loop it was opened on.
+# Each entry is (compiled app, aiosqlite connection); the lock serializes its creation.
+_ASYNC_APPS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[Any, aiosqlite.Connection]]" = weakref.WeakKeyDictionary()
+_ASYNC_APP_LOCKS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+
+def _thread_config(thread_id: str, user_id: str) -> Dict[str, Any]:
+    """Build the LangGraph config that keys checkpoints on the thread."""
+    return {
+        "configurable": {
+            "thread_id": thread_id,
+            "user_id": user_id or "anonymous"
+        }
+    }
+
+
+def initialize_thread(
+    thread_id: str, user_id: str = None,
+    conversation_history: Optional[List[BaseMessage]] = None
+) -> List[BaseMessage]:
+    """Build the seed messages (saved chat history) for a new thread."""
+    if conversation_history is None:
+        conversation_history = load_conversation_history(
+            token_tracker, user_id or "anonymous", thread_id, limit=10
+        )
+
+    # Debug: Log what conversation history we loaded
+    logger.opt(lazy=True).debug(
+        "Loaded conversation history:\n{}",
+        lambda: "\n".join(
+            f"  {i+1}. {type(msg).__name__}: {msg.content[:100]}..."
+            for i, msg in enumerate(conversation_history)
+        ) or "  (none)"
+    )
+    
+    # Priming is prepended by call_model, so a new thread is seeded with history only
+    return list(conversation_history)
+
+
+def _build_turn_messages(
+    user_query: str, thread_id: str, user_id: str,
+    previous_state: Dict[str, Any], conversation_history: List[BaseMessage]
+) -> List[BaseMessage]:
+    """Seed new threads; later turns only append the query to the checkpointed messages."""
+    if previous_state.get("messages"):
+        return [HumanMessage(content=user_query)]
+    logger.info("New thread - seeding from chat history")
+    seed_messages = initialize_thread(thread_id, user_id, conversation_history)
+    return seed_messages + [HumanMessage(content=user_query)]
+
+
+def _save_turn_tokens(
+    result: Dict[str, Any], previous_state: Dict[str, Any],
+    thread_id: str, user_id: str
+):
+    """Save the tokens spent in this turn (the state counters are cumulative per thread)."""
+    total_input_tokens = result.get("input_tokens", 0) - previous_state.get("input_tokens", 0)
+    total_output_tokens = result.get("output_tokens", 0) - previous_state.get("output_tokens", 0)
+    total_cached_tokens = result.get("cached_tokens", 0) - previous_state.get("cached_tokens", 0)
+    if total_input_tokens > 0 or total_output_tokens > 0:
+        token_tracker.save_token_usage(
+            user_id=user_id or "anonymous",
+            thread_id=thread_id,
+            input_tokens=total_input_tokens,
+            output_tokens=total_output_tokens,
+            cached_tokens=total_cached_tokens
+        )
+
+
+def _build_response(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape the final agent state into a chatbot response."""
+    # Get the final AI message
+    final_message = result["messages"][-1]
+    final_message_content = final_message.content
+    logger.debug("Final message content: {}", final_message_content)
+
+    # If agent explicitly says it doesn't have information, return that
+    if "I don't have any information on that." in final_message_content:
+        return _text_response(final_message_content)
+
+    data = result["data"]
+
+    # Check if we got a table from tools
+    if isinstance(data, dict) and data.get('type') == 'table':
+        logger.debug("final_answer: is table")
+        return _data_response("table", data)
+    
+    # Check if we got a chart from tools
+    if isinstance(data, dict) and data.get('type') == 'chart':
+        logger.debug("final_answer: is chart")
+        return _data_response("chart", data)
+
+    # Check if we got a chart from tools
+    if isinstance(data, dict) and data.get('type') == 'image':
+        logger.debug("final_answer: is image")
+        return _data_response("image", data)
+
+    # Check if tools were used this turn and if they provided meaningful data
+    tool_meta = result.get("last_tool_meta") or {}
+    
+    if tool_meta:
+        source_info = tool_meta.get("source")
+        
+        # If tools were used but didn't find meaningful data, update the message
+        if not tool_meta.get("meaningful"):
+            final_message_content = (
+                "I couldn't find relevant campaign information for your question. "
+                "Please try rephrasing or ask about a specific campaign, metric, topic or segment!"
+            )
+            source_info = None
+    else:
+        # No tools were used - agent answered from conversation history or knowledge
+        # Keep the agent's response as-is
+        logger.debug("No tools used - agent responded from conversation history or knowledge")
+        source_info = None
+    
+    return _text_response(final_message_content, source_info)
+
+
+def _run_agent(
+    user_query: str, thread_id: str, user_id: str,
+    previous_state: Dict[str, Any], conversation_history: List[BaseMessage]
+) -> Dict[str, Any]:
+    """Run one turn of the compiled agent and shape its final state into a response."""
+    thread_config = _thread_config(thread_id, user_id)
+    logger.debug("Thread config: {}", thread_config)
+
+    turn_messages = _build_turn_messages(
+        user_query, thread_id, user_id, previous_state, conversation_history
+    )
+    
+    # The checkpointer already holds earlier turns, message_reducer appends to them
+    logger.debug("Before: app.invoke")
+    result = APP.invoke(
+        {"messages": turn_messages, "data": {}, "last_tool_meta": {}}, 
+        config=thread_config  # This enables session persistence
+    )
+    logger.debug("After: app.invoke")
+
+    _save_turn_tokens(result, previous_state, thread_id, user_id)
+    return _build_response(result)
+
+
+async def _get_async_app():
+    """Compile the workflow against an AsyncSqliteSaver bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    entry = _ASYNC_APPS.get(loop)
+    if entry is None:
+        async with _ASYNC_APP_LOCKS.setdefault(loop, asyncio.Lock()):
+            entry = _ASYNC_APPS.get(loop)
+            if entry is None:
+                aconn = await aiosqlite.connect(db_path)
+                await aconn.execute("PRAGMA synchronous=NORMAL")
+                entry = (workflow.compile(checkpointer=AsyncSqliteSaver(aconn)), aconn)
+                _ASYNC_APPS[loop] = entry
+    return entry[0]
+
+
+async def close_async_app():
+    """Close the running event loop's checkpointer connection; call before the loop shuts down."""
+    loop = asyncio.get_running_loop()
+    _ASYNC_APP_LOCKS.pop(loop, None)
+    entry = _ASYNC_APPS.pop(loop, None)
+    if entry is not None:
+        await entry[1].close()
+
+
+async def _arun_agent(
+    app, user_query: str, thread_id: str, user_id: str,
+    previous_state: Dict[str, Any], conversation_history: List[BaseMessage]
+) -> Dict[str, Any]:
+    """Async variant of _run_agent that keeps checkpoint I/O off the event loop."""
+    thread_config = _thread_config(thread_id, user_id)
+    logger.debug("Thread config: {}", thread_config)
+
+    turn_messages = await asyncio.to_thread(
+        _build_turn_messages, user_query, thread_id, user_id, previous_state, conversation_history
+    )
+
+    result = await app.ainvoke(
+        {"messages": turn_messages, "data": {}, "last_tool_meta": {}},
+        config=thread_config
+    )
+
+    await asyncio.to_thread(_save_turn_tokens, result, previous_state, thread_id, user_id)
+    return _build_response(result)
+
+
+class _CacheLookup(NamedTuple):
+    """A response served without the agent, or what is needed to cache the agent's one."""
+    response: Optional[Dict[str, Any]]
+    conversation_history: List[BaseMessage]
+    cache_key: str
+    query_embedding: Any
+
+
+def _lookup_fast_response(
+    user_query: str, thread_id: str, user_id: str, previous_state: Dict[str, Any]
+) -> _CacheLookup:
+    """Resolve the thread history, then check the response caches and the off-topic gate."""
+    # Checkpointed threads carry their own history; only new threads read chat_history
+    conversation_history = list(previous_state.get("messages", []))
+    if not conversation_history:
+        conversation_history = load_conversation_history(
+            token_tracker, user_id or "anonymous", thread_id, limit=10
+        )
+
+    # Serve repeated questions in an unchanged conversation from the cache
+    cache_key = response_cache.make_key(
+        LLM_MODEL_NAME, user_id or "anonymous", thread_id,
+        user_query, conversation_history
+    )
+    cached_response = response_cache.get(cache_key)
+    if cached_response is not None:
+        logger.info("Response cache hit")
+        return _CacheLookup(cached_response, conversation_history, cache_key, None)
+
+    # Fall back to a paraphrase lookup within the same thread
+    query_embedding = response_cache.embed(user_query)
+    cached_response = response_cache.get_similar(
+        user_id or "anonymous", thread_id, user_query, query_embedding
+    )
+    if cached_response is None and offtopic_gate.is_off_topic(user_query, query_embedding):
+        logger.info("Off-topic query answered without the LLM")
+        cached_response = _text_response(OFFTOPIC_MESSAGE)
+    return _CacheLookup(cached_response, conversation_history, cache_key, query_embedding)
+
+
+def _store_cached_response(
+    lookup: _CacheLookup, user_query: str, thread_id: str, user_id: str,
+    response: Dict[str, Any]
+):
+    """Store a generated response in the exact and semantic response caches."""
+    response_cache.set(lookup.cache_key, response, thread_id=thread_id)
+    response_cache.add_similar(
+        user_id or "anonymous", thread_id, user_query, lookup.query_embedding, response
+    )
+
+
+def _fast_turn_update(
+    lookup: _CacheLookup, user_query: str, thread_id: str, user_id: str,
+    previous_state: Dict[str, Any]
+) -> Dict[str, Any]:
+    """State update that checkpoints a turn answered from the cache or the off-topic gate."""
+    turn_messages = _build_turn_messages(
+        user_query, thread_id, user_id, previous_state, lookup.conversation_history
+    )
+    reply = AIMessage(content=lookup.response.get("message", ""))
+    return {"messages": turn_messages + [reply], "data": {}, "last_tool_meta": {}}
+
+
+def _record_fast_turn(
+    lookup: _CacheLookup, user_query: str, thread_id: str, user_id: str,
+    previous_state: Dict[str, Any]
+):
+    """Append a fast-path turn to the thread's checkpoint so later turns see it."""
+    try:
+        APP.update_state(
+            _thread_config(thread_id, user_id),
+            _fast_turn_update(lookup, user_query, thread_id, user_id, previous_state),
+            as_node="agent"
+        )
+    except Exception as e:
+        logger.error(f"Error checkpointing cached turn for thread {thread_id}: {e}")
+
+
+async def _arecord_fast_turn(
+    app, lookup: _CacheLookup, user_query: str, thread_id: str, user_id: str,
+    previous_state: Dict[str, Any]
+):
+    """Async variant of _record_fast_turn for the AsyncSqliteSaver graph."""
+    try:
+        update = await asyncio.to_thread(
+            _fast_turn_update, lookup, user_query, thread_id, user_id, previous_state
+        )
+        await app.aupdate_state(_thread_config(thread_id, user_id), update, as_node="agent")
+    except Exception as e:
+        logger.error(f"Error checkpointing cached turn for thread {thread_id}: {e}")
 
 
 def chat_query_with_custom_agent(
@@ -167,341 +776,108 @@ def chat_query_with_custom_agent(
         f"[Thread: {thread_id}, User: {user_id}]"
     )
     
-    # Track tokens - simple counters
-    total_input_tokens = 0
-    total_output_tokens = 0
-    
     try:
-        # Use all tools from llm_tools
-        all_tools = LLM_TOOLS
-        
-        # Create a tool lookup dictionary
-        tools_dict = {tool.name: tool for tool in all_tools}
-        
-        # Bind tools to the LLM
-        llm_with_tools = llm.bind_tools(all_tools)
-        
-        # Define the agent node with Deepseek tool call parsing
-        def call_model(state):
-            nonlocal total_input_tokens, total_output_tokens
-            messages = state["messages"]
-            logger.info(f"\n\n messages:\n {messages}")
-
-            data = state.get("data", {})
-            
-            # Log conversation context for debugging
-            logger.info(
-                f"call_model() - Processing {len(messages)} messages "
-                f"for User: {user_id}, Thread: {thread_id}"
-            )
-            logger.info(f"Message types: {[type(msg).__name__ for msg in messages]}")
-            logger.info(f"Data: {data}")
-            
-            response = llm_with_tools.invoke(messages)
-            
-            # Check if this is a Deepseek model response with custom tool format
-            if hasattr(response, 'content') and '[TOOL_REQUEST]' in response.content:
-                logger.info("Detected Deepseek tool call format, parsing...")
-                logger.info(f"Original content: {response.content}")
-                
-                # Parse Deepseek's tool calls
-                tool_calls = parse_deepseek_tool_calls(response.content)
-                
-                if tool_calls:
-                    logger.info(f"Parsed {len(tool_calls)} tool calls: {tool_calls}")
-                    
-                    # Clean the content by removing tool request markers and think blocks
-                    cleaned_content = clean_deepseek_content(response.content)
-                    
-                    # Create a new message with proper tool calls and cleaned content
-                    response = AIMessage(
-                        content=cleaned_content,
-                        tool_calls=tool_calls
-                    )
-                    logger.info(f"Created new message with tool calls: {response.tool_calls}")
-            
-            # Also clean content for responses without tool calls but with think blocks or tool results
-            elif hasattr(response, 'content') and ('<think>' in response.content or '[TOOL_RESULT]' in response.content):
-                logger.info("Detected Deepseek thinking blocks or tool results, cleaning...")
-                cleaned_content = clean_deepseek_content(response.content)
-                response = AIMessage(content=cleaned_content)
-                logger.info("Cleaned thinking blocks and tool results from content")
-            
-            # Simple token tracking - extract from response if available
-            if hasattr(response, 'usage_metadata') and response.usage_metadata:
-                usage = response.usage_metadata
-                total_input_tokens += usage.get('input_tokens', 0)
-                total_output_tokens += usage.get('output_tokens', 0)
-                logger.info(f"Tokens - Input: {usage.get('input_tokens', 0)}, Output: {usage.get('output_tokens', 0)}")
-            
-            return {"messages": [response]}
-        
-        # Define the tool execution node
-        def call_tools(state):
-            logger.info(f"call_tools() - Thread: {thread_id}")
-            messages = state["messages"]
-            data = state.get("data", {})
-            last_message = messages[-1]
-
-            # Execute tool calls
-            tool_messages = []
-            for tool_call in last_message.tool_calls:
-                tool_name = tool_call["name"]
-                tool_input = tool_call["args"]
-                
-                if tool_name in tools_dict:
-                    try:
-                        response = tools_dict[tool_name].invoke(tool_input)
-                        tool_message = ToolMessage(
-                            content=str(response),
-                            name=tool_name,
-                            tool_call_id=tool_call["id"]
-                        )
-                        tool_messages.append(tool_message)
-
-                        if isinstance(response, dict) and response.get('type') in ['table']:
-                            logger.info(f"response: is table")
-                            data = response
-
-                        if isinstance(response, dict) and response.get('type') in ['chart']:
-                            logger.info(f"response: is chart")
-                            data = response
-
-                        if isinstance(response, dict) and response.get('type') in ['image']:
-                            logger.info(f"response: is image")
-                            image_url = response.get("image_url", "")
-                            if image_url:
-                                data = response
-
-                    except Exception as e:
-                        error_message = ToolMessage(
-                            content=f"Error executing tool {tool_name}: {str(e)}",
-                            name=tool_name,
-                            tool_call_id=tool_call["id"]
-                        )
-                        tool_messages.append(error_message)
-                else:
-                    error_message = ToolMessage(
-                        content=f"Unknown tool: {tool_name}",
-                        name=tool_name,
-                        tool_call_id=tool_call["id"]
-                    )
-                    tool_messages.append(error_message)
-            
-            return {
-                "messages": tool_messages,
-                "data": data
-            }
-        
-        # Define the condition to decide next step
-        def should_continue(state):
-            messages = state["messages"]
-            last_message = messages[-1]
-            if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-                return "tools"
-            return END
-        
-        # Create the graph
-        workflow = StateGraph(AgentState)
-        
-        # Add nodes
-        workflow.add_node("agent", call_model)
-        workflow.add_node("tools", call_tools)
-        
-        # Set entry point
-        workflow.set_entry_point("agent")
-        
-        # Add conditional edges
-        workflow.add_conditional_edges(
-            "agent",
-            should_continue,
-            {
-                "tools": "tools",
-                END: END
-            }
+        # One checkpoint read serves first-turn detection, history and token deltas
+        previous_state = APP.get_state(_thread_config(thread_id, user_id)).values
+        lookup = _lookup_fast_response(user_query, thread_id, user_id, previous_state)
+        if lookup.response is not None:
+            _record_fast_turn(lookup, user_query, thread_id, user_id, previous_state)
+            return lookup.response
+
+        response = _run_agent(
+            user_query, thread_id, user_id, previous_state, lookup.conversation_history
         )
+        _store_cached_response(lookup, user_query, thread_id, user_id, response)
+        return response
         
-        # Add edge from tools back to agent
-        workflow.add_edge("tools", "agent")
+    except Exception as e:
+        logger.error(f"Error in custom LangGraph agent: {e}")
+        return dict(_ERROR_RESPONSE)
 
-        # Compile the graph with SQLite checkpointer
-        app = workflow.compile(checkpointer=checkpointer)
-        
-        # Enhanced thread config with user info
-        thread_config = {
-            "configurable": {
-                "thread_id": thread_id,
-                "user_id": user_id or "anonymous"
-            }
-        }
-        
-        logger.info(f"Thread config: {thread_config}")
-        
-        # Load conversation history from SQLite and build initial messages
-        conversation_history = load_conversation_history(token_tracker, user_id or "anonymous", thread_id, limit=10)
-        
-        # Debug: Log what conversation history we loaded
-        if conversation_history:
-            logger.info(f"Loaded conversation history:")
-            for i, msg in enumerate(conversation_history):
-                logger.info(f"  {i+1}. {type(msg).__name__}: {msg.content[:100]}...")
-        else:
-            logger.info("No conversation history found")
-        
-        # Initialize with priming sequence
-        initial_messages = [
-            SystemMessage(content=(
-                "You are ONLY a Campaign Analytics Assistant. "
-                "You MUST reject ANY non-campaign queries immediately."
-            )),
-            # Prime with example exchange
-            HumanMessage(content="Tell me a joke"),
-            AIMessage(content=(
-                "I am a Campaign Analytics Assistant. I can only provide "
-                "information about campaign performance data."
-            )),
-            HumanMessage(content="How are you today?"),
-            AIMessage(content=(
-                "I am a Campaign Analytics Assistant. I can only provide "
-                "information about campaign performance data."
-            )),
-            # Reinforce with strict system message
-            SystemMessage(content=(
-                "You are a Campaign Performance Assistant with a strict focus on campaign analytics data. "
-                "Your responses MUST be based ONLY on: "
-                "1. Information from previous conversations in our chat history "
-                "2. Data retrieved through campaign data tools "
-                "3. Direct campaign performance metrics and analytics "
-                
-                "STRICT RULES: "
-                "- NEVER create, invent, or make up any information "
-                "- NEVER tell jokes or engage in casual conversation "
-                "- NEVER provide responses about topics outside of campaign performance "
-                "- If information is not in the chat history or available through tools, respond ONLY with: 'I can only provide information about campaign performance based on available data.' "
-                
-                "WORKFLOW: "
-                "1. First, check conversation history for relevant information "
-                "2. If history doesn't contain the answer, use campaign data tools "
-                "3. If neither source has the information, provide the standard response "
-                
-                "Remember: You are an analytics tool, not a conversational AI. "
-                "Stay focused only on campaign performance data and metrics."
-            ))
-        ]
-                
-        # Add conversation history after system messages
-        initial_messages.extend(conversation_history)
-        
-        # Add current user query
-        initial_messages.append(HumanMessage(content=user_query))
-        
-        logger.info(f"Initial messages count: {len(initial_messages)} (including {len(conversation_history)} from history)")
-        logger.info(f"Initial messages:\n{initial_messages}")
-        
-        # Run the agent with populated conversation history
-        logger.info("\n Before: app.invoke with populated history")
-        result = app.invoke(
-            {"messages": initial_messages, "data": {}}, 
-            config=thread_config  # This enables session persistence
+
+async def chat_query_async(
+    user_query: str, thread_id: str = "default", user_id: str = None
+) -> Dict[str, Any]:
+    """Async chat function for event-loop callers - uses AsyncSqliteSaver and ainvoke."""
+    logger.info(
+        f"Processing async query with LangGraph agent: {user_query} "
+        f"[Thread: {thread_id}, User: {user_id}]"
+    )
+
+    try:
+        app = await _get_async_app()
+        previous_state = (await app.aget_state(_thread_config(thread_id, user_id))).values
+        lookup = await asyncio.to_thread(
+            _lookup_fast_response, user_query, thread_id, user_id, previous_state
         )
-        logger.info("\n After: app.invoke with populated history")
-
-        # Save token usage if we tracked any tokens
-        if total_input_tokens > 0 or total_output_tokens > 0:
-            token_tracker.save_token_usage(
-                user_id=user_id or "anonymous",
-                thread_id=thread_id,
-                input_tokens=total_input_tokens,
-                output_tokens=total_output_tokens
-            )
+        if lookup.response is not None:
+            await _arecord_fast_turn(app, lookup, user_query, thread_id, user_id, previous_state)
+            return lookup.response
+
+        response = await _arun_agent(
+            app, user_query, thread_id, user_id, previous_state, lookup.conversation_history
+        )
+        await asyncio.to_thread(
+            _store_cached_response, lookup, user_query, thread_id, user_id, response
+        )
+        return response
 
-        # Get the final AI message
-        final_message = result["messages"][-1]
-        final_message_content = final_message.content
-        logger.info(f"Final message content: {final_message_content}")
-
-        # If agent explicitly says it doesn't have information, return that
-        if "I don't have any information on that." in final_message_content:
-            return ChatbotResponse.create_text_response(
-                message=final_message_content
-            ).to_dict()
-
-        data = result["data"]
-
-        # Check if we got a table from tools
-        if isinstance(data, dict) and data.get('type') == 'table':
-            logger.info("final_answer: is table")
-            return ChatbotResponse.create_table_response(
-                message="Here are the results",
-                data=data
-            ).to_dict()
-        
-        # Check if we got a chart from tools
-        if isinstance(data, dict) and data.get('type') == 'chart':
-            logger.info("final_answer: is chart")
-            return ChatbotResponse.create_chart_response(
-                message="Here are the results",
-                data=data
-            ).to_dict()
-
-        # Check if we got a chart from tools
-        if isinstance(data, dict) and data.get('type') == 'image':
-            logger.info("final_answer: is image")
-            return ChatbotResponse.create_image_response(
-                message="Here are the results",
-                data=data
-            ).to_dict()
-
-        # Check if tools were used and if they provided meaningful data
-        tool_messages = [msg for msg in result["messages"] if isinstance(msg, ToolMessage)]
-        
-        if tool_messages:
-            # Tools were used - check if they provided meaningful data
-            meaningful_data = False
-            source_info = None
-            
-            for tool_msg in tool_messages:
-                try:
-                    tool_content_dict = ast.literal_eval(tool_msg.content)
-                    if "No relevant campaign documents found" not in tool_msg.content:
-                        if "not found" not in tool_msg.content.lower() and "error" not in tool_msg.content.lower():
-                            meaningful_data = True
-                            source_info = tool_content_dict.get('source')
-                            break
-                except (ValueError, SyntaxError):
-                    # If content isn't a valid Python literal, check as string
-                    if "No relevant campaign documents found" not in tool_msg.content:
-                        if "not found" not in tool_msg.content.lower() and "error" not in tool_msg.content.lower():
-                            meaningful_data = True
-                            break
-            
-            # If tools were used but didn't find meaningful data, update the message
-            if not meaningful_data:
-                final_message_content = (
-                    "I couldn't find relevant campaign information for your question. "
-                    "Please try rephrasing or ask about a specific campaign, metric, topic or segment!"
-                )
-                source_info = None
-        else:
-            # No tools were used - agent answered from conversation history or knowledge
-            # Keep the agent's response as-is
-            logger.info("No tools used - agent responded from conversation history or knowledge")
-            source_info = None
-        
-        return ChatbotResponse.create_text_response(
-            message=final_message_content,
-            source=source_info if source_info else None
-        ).to_dict()
-        
     except Exception as e:
-        logger.error(f"Error in custom LangGraph agent: {e}")
-        return ChatbotResponse.create_error_response(
-            message=(
-                "I couldn't find relevant campaign information for your "
-                "question. Please try rephrasing or ask about a specific "
-                "campaign, metric, topic or segment!"
-            )
-        ).to_dict()
+        logger.error(f"Error in async LangGraph agent: {e}")
+        return dict(_ERROR_RESPONSE)
+
+
+async def chat_query_stream(
+    user_query: str, thread_id: str = "default", user_id: str = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Stream the agent's answer as token events, ending with the full response dict."""
+    logger.info(
+        f"Streaming query with LangGraph agent: {user_query} "
+        f"[Thread: {thread_id}, User: {user_id}]"
+    )
+
+    try:
+        app = await _get_async_app()
+        thread_config = _thread_config(thread_id, user_id)
+        previous_state = (await app.aget_state(thread_config)).values
+        lookup = await asyncio.to_thread(
+            _lookup_fast_response, user_query, thread_id, user_id, previous_state
+        )
+        if lookup.response is not None:
+            await _arecord_fast_turn(app, lookup, user_query, thread_id, user_id, previous_state)
+            yield {"type": "final", "response": lookup.response}
+            return
+
+        turn_messages = await asyncio.to_thread(
+            _build_turn_messages, user_query, thread_id, user_id,
+            previous_state, lookup.conversation_history
+        )
+        async for event in app.astream_events(
+            {"messages": turn_messages, "data": {}, "last_tool_meta": {}},
+            config=thread_config,
+            version="v2"
+        ):
+            if event["event"] != "on_chat_model_stream":
+                continue
+            content = event["data"]["chunk"].content
+            if content:
+                yield {"type": "token", "content": content}
+
+        # Table/chart/image results come from the final state, same as the invoke path
+        result = (await app.aget_state(thread_config)).values
+        await asyncio.to_thread(_save_turn_tokens, result, previous_state, thread_id, user_id)
+        response = _build_response(result)
+        await asyncio.to_thread(
+            _store_cached_response, lookup, user_query, thread_id, user_id, response
+        )
+        yield {"type": "final", "response": response}
+
+    except Exception as e:
+        logger.error(f"Error streaming LangGraph agent: {e}")
+        yield {
+            "type": "final",
+            "response": dict(_ERROR_RESPONSE)
+        }
 
 
 def chat_query(user_query: str, thread_id: str = "default",
@@ -512,6 +888,7 @@ def chat_query(user_query: str, thread_id: str = "default",
 
 def clear_memory(thread_id: str = "default", user_id: str = None):
     """Clear conversation history for a specific thread."""
+    response_cache.clear_thread(thread_id)
     return memory_manager.clear_memory(thread_id, user_id)
 
 
@@ -0,0 +1,284 @@
+# response_cache.py
+"""
+Response cache for the campaign assistant chatbot.
+Short-circuits repeated questions with an in-process LRU backed by SQLite,
+and paraphrased repeats with an embedding similarity lookup per thread.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.messages import BaseMessage
+from loguru import logger
+
+from ._db import ConnectionSource, as_connection_factory
+
+# Cache configuration from environment
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds
+RESPONSE_CACHE_HISTORY = 10  # Number of history messages folded into the key
+RESPONSE_CACHE_TAU = float(os.getenv("RESPONSE_CACHE_TAU", "0.90"))  # cosine threshold
+# Semantic entries kept per thread; older ones are dropped on write
+RESPONSE_CACHE_THREAD_ROWS = int(os.getenv("RESPONSE_CACHE_THREAD_ROWS", "200"))
+RESPONSE_CACHE_PRUNE_INTERVAL = 60  # seconds between deletes of expired rows
+
+# Numbers (campaign IDs, limits) must match exactly for a semantic hit
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+# Queries that lean on earlier turns ("what about its open rate?") mean different
+# things as the conversation moves on, so they never use the semantic cache
+RESPONSE_CACHE_MIN_WORDS = 4
+_ANAPHORA_RE = re.compile(
+    r"\b(?:it|its|it's|this|that|these|those|they|them|their|same|previous|"
+    r"above|earlier|former|latter|what about|how about)\b",
+    re.IGNORECASE
+)
+
+
+def is_context_dependent(user_query: str) -> bool:
+    """Whether a query is too short or anaphoric to be answered without its history."""
+    return (len(user_query.split()) < RESPONSE_CACHE_MIN_WORDS
+            or _ANAPHORA_RE.search(user_query) is not None)
+
+
+class ResponseCache:
+    """Caches chatbot responses keyed on model, user, thread, query and recent history."""
+
+    def __init__(self, db_connection: ConnectionSource,
+                 maxsize: int = RESPONSE_CACHE_SIZE, ttl: int = RESPONSE_CACHE_TTL,
+                 embed_fn: Optional[Callable[[str], List[float]]] = None,
+                 tau: float = RESPONSE_CACHE_TAU):
+        """Initialize response cache with a connection (or per-thread factory) and optional query embedder."""
+        self._get_conn = as_connection_factory(db_connection)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.embed_fn = embed_fn
+        self.tau = tau
+        self._lru: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (ts, payload, thread_id)
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self.init_response_cache()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Database connection for the calling thread."""
+        return self._get_conn()
+
+    def init_response_cache(self):
+        """Initialize the persistent response cache table."""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    thread_id TEXT,
+                    payload BLOB NOT NULL,
+                    ts INTEGER NOT NULL
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_response_cache_thread
+                ON response_cache(thread_id)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_response_cache_ts
+                ON response_cache(ts)
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache_semantic (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT,
+                    thread_id TEXT,
+                    query TEXT NOT NULL,
+                    embedding BLOB NOT NULL,    -- L2-normalized float32 vector
+                    payload BLOB NOT NULL,
+                    ts INTEGER NOT NULL
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_response_cache_semantic_thread
+                ON response_cache_semantic(user_id, thread_id, ts)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_response_cache_semantic_ts
+                ON response_cache_semantic(ts)
+            """)
+            self.conn.commit()
+            logger.info("Response cache table initialized")
+        except Exception as e:
+            logger.error(f"Error initializing response cache table: {e}")
+
+    @staticmethod
+    def make_key(model: str, user_id: str, thread_id: str, user_query: str,
+                 history: Sequence[BaseMessage] = ()) -> str:
+        """Build a stable cache key for a query in the context of its recent history."""
+        recent = history[-RESPONSE_CACHE_HISTORY:]
+        hist_hash = hashlib.sha256(
+            json.dumps([(type(m).__name__, m.content) for m in recent]).encode()
+        ).hexdigest()
+        raw = json.dumps({
+            "model": model,
+            "thread_id": thread_id,
+            "user_id": user_id,
+            "q": user_query.strip().lower(),
+            "hist_hash": hist_hash
+        }, sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached response, or None on a miss or expired entry."""
+        now = int(time.time())
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                ts, payload, _ = entry
+                if now - ts <= self.ttl:
+                    self._lru.move_to_end(key)
+                    return payload
+                del self._lru[key]
+
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "SELECT payload, ts, thread_id FROM response_cache WHERE key = ?", (key,)
+            )
+            row = cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Error reading response cache: {e}")
+            return None
+
+        if not row or now - row[1] > self.ttl:
+            return None
+
+        payload = json.loads(row[0])
+        self._remember(key, row[1], payload, row[2])
+        return payload
+
+    def set(self, key: str, payload: Dict[str, Any], thread_id: str = None):
+        """Store a response in memory and in SQLite."""
+        ts = int(time.time())
+        self._remember(key, ts, payload, thread_id)
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                INSERT OR REPLACE INTO response_cache (key, thread_id, payload, ts)
+                VALUES (?, ?, ?, ?)
+            """, (key, thread_id, json.dumps(payload), ts))
+            self._prune_expired(cursor, ts)
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Error writing response cache: {e}")
+
+    def embed(self, user_query: str) -> Optional[np.ndarray]:
+        """Embed and L2-normalize a query, or return None when no embedder is configured."""
+        if self.embed_fn is None:
+            return None
+        try:
+            vector = np.asarray(self.embed_fn(user_query.strip().lower()), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            return vector / norm if norm else None
+        except Exception as e:
+            logger.error(f"Error embedding query for response cache: {e}")
+            return None
+
+    def get_similar(self, user_id: str, thread_id: str, user_query: str,
+                    embedding: Optional[np.ndarray]) -> Optional[Dict[str, Any]]:
+        """Return the cached response of the nearest earlier query in the thread above tau."""
+        if embedding is None or is_context_dependent(user_query):
+            return None
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT query, embedding, payload
+                FROM response_cache_semantic
+                WHERE user_id = ? AND thread_id = ? AND ts >= ?
+            """, (user_id, thread_id, int(time.time()) - self.ttl))
+            rows = [row for row in cursor.fetchall() if len(row[1]) == embedding.nbytes]
+        except Exception as e:
+            logger.error(f"Error reading semantic response cache: {e}")
+            return None
+
+        if not rows:
+            return None
+
+        matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+        scores = matrix @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.tau:
+            return None
+        if _NUMBER_RE.findall(rows[best][0]) != _NUMBER_RE.findall(user_query):
+            return None
+
+        logger.info(f"Semantic cache hit (cosine={scores[best]:.3f})")
+        return json.loads(rows[best][2])
+
+    def add_similar(self, user_id: str, thread_id: str, user_query: str,
+                    embedding: Optional[np.ndarray], payload: Dict[str, Any]):
+        """Store a response under the query embedding for later paraphrase lookups."""
+        if embedding is None or is_context_dependent(user_query):
+            return
+        ts = int(time.time())
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                INSERT INTO response_cache_semantic
+                (user_id, thread_id, query, embedding, payload, ts)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (user_id, thread_id, user_query, embedding.tobytes(),
+                  json.dumps(payload), ts))
+            # Keep only the newest entries of this thread
+            cursor.execute("""
+                DELETE FROM response_cache_semantic
+                WHERE user_id = ? AND thread_id = ? AND id NOT IN (
+                    SELECT id FROM response_cache_semantic
+                    WHERE user_id = ? AND thread_id = ?
+                    ORDER BY id DESC
+                    LIMIT ?
+                )
+            """, (user_id, thread_id, user_id, thread_id, RESPONSE_CACHE_THREAD_ROWS))
+            self._prune_expired(cursor, ts)
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Error writing semantic response cache: {e}")
+
+    def clear_thread(self, thread_id: str):
+        """Invalidate every cached response for a thread."""
+        with self._lock:
+            for key in [k for k, entry in self._lru.items() if entry[2] == thread_id]:
+                del self._lru[key]
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "DELETE FROM response_cache WHERE thread_id = ?", (thread_id,)
+            )
+            cursor.execute(
+                "DELETE FROM response_cache_semantic WHERE thread_id = ?", (thread_id,)
+            )
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Error clearing response cache for thread {thread_id}: {e}")
+
+    def _prune_expired(self, cursor: sqlite3.Cursor, now: int):
+        """Delete expired rows from both tables, at most once per prune interval."""
+        if now - self._last_prune < RESPONSE_CACHE_PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        cutoff = now - self.ttl
+        cursor.execute("DELETE FROM response_cache WHERE ts < ?", (cutoff,))
+        cursor.execute("DELETE FROM response_cache_semantic WHERE ts < ?", (cutoff,))
+
+    def _remember(self, key: str, ts: int, payload: Dict[str, Any], thread_id: str = None):
+        """Insert into the in-process LRU, evicting the oldest entry when full."""
+        with self._lock:
+            self._lru[key] = (ts, payload, thread_id)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
@@ -4,29 +4,85 @@ Token usage tracking module for the campaign assistant chatbot.
 Handles token usage statistics, database initialization, and user analytics.
 """
 
+import atexit
+import orjson
+import queue
 import sqlite3
+import threading
+import time
 from loguru import logger
-from typing import Dict, Any, Optional, List
-import sys
+from typing import Dict, Any, Iterator, Optional, List
 import os
 
-# Add parent directory to path for centralized logging
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from logs.config import LogConfig, setup_logger
+from ._db import ConnectionSource, as_connection_factory
 
 # Configure centralized logging for token tracking
 setup_logger(logger, LogConfig.get_token_log(), LogConfig.AGENT_FORMAT)
 
+# Seconds between background flushes of queued token usage and chat rows
+TOKEN_FLUSH_INTERVAL = float(os.getenv("TOKEN_FLUSH_INTERVAL", "0.2"))
+# Queued chat messages that trigger an immediate flush
+CHAT_FLUSH_BATCH = int(os.getenv("CHAT_FLUSH_BATCH", "32"))
+# Rows fetched per round when reading chat history
+CHAT_HISTORY_BATCH = 20
+
+# Schema setup runs once per process, however many trackers are created
+_INIT_LOCK = threading.Lock()
+_INITIALIZED = False
+
+# Insert statements kept constant so sqlite3's statement cache reuses them
+_INSERT_TOKEN_SQL = """
+    INSERT INTO token_usage
+    (user_id, thread_id, input_tokens, output_tokens,
+     total_tokens, cached_tokens, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+_INSERT_CHAT_SQL = """
+    INSERT INTO chat_history
+    (user_id, thread_id, role, content, response_type, chart_type,
+     table_data, source, image_url, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _utc_timestamp() -> str:
+    """Current UTC time in the format SQLite's CURRENT_TIMESTAMP uses."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+
 class TokenTracker:
     """Handles token usage tracking and analytics."""
     
-    def __init__(self, db_connection: sqlite3.Connection):
-        """Initialize token tracker with database connection."""
-        self.conn = db_connection
-        self.init_token_tracking()
+    def __init__(self, db_connection: ConnectionSource,
+                 flush_interval: float = TOKEN_FLUSH_INTERVAL):
+        """Initialize token tracker with a database connection or per-thread connection factory."""
+        global _INITIALIZED
+        self._get_conn = as_connection_factory(db_connection)
+        with _INIT_LOCK:
+            if not _INITIALIZED:
+                _INITIALIZED = self.init_token_tracking()
+
+        # Token usage and chat messages are queued and written in batches by a daemon thread
+        self._pending_usage: "queue.SimpleQueue[tuple]" = queue.SimpleQueue()
+        self._pending_chat: "queue.SimpleQueue[tuple]" = queue.SimpleQueue()
+        self._flush_lock = threading.Lock()
+        # Rows from a failed flush, written ahead of newer rows on the next one
+        self._retry_usage: List[tuple] = []
+        self._retry_chat: List[tuple] = []
+        self._flusher = threading.Thread(
+            target=self._flush_loop, args=(flush_interval,),
+            name="token-tracking-flusher", daemon=True
+        )
+        self._flusher.start()
+        atexit.register(self.flush)
     
-    def init_token_tracking(self):
-        """Initialize token usage tracking table and chat history table."""
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Database connection for the calling thread."""
+        return self._get_conn()
+
+    def init_token_tracking(self) -> bool:
+        """Initialize token usage tracking table and chat history table; returns whether it succeeded."""
         try:
             cursor = self.conn.cursor()
             
@@ -39,21 +95,27 @@ class TokenTracker:
                     input_tokens INTEGER DEFAULT 0,
                     output_tokens INTEGER DEFAULT 0,
                     total_tokens INTEGER DEFAULT 0,
+                    cached_tokens INTEGER DEFAULT 0,
                     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
                 )
             """)
-            
-            # Backup existing data if table exists
-            try:
-                cursor.execute("SELECT * FROM chat_history")
-                existing_data = cursor.fetchall()
-            except sqlite3.OperationalError:
-                existing_data = []
 
-            # Drop and recreate chat history table
-            cursor.execute("DROP TABLE IF EXISTS chat_history")
+            # Per-user lookups scan this index in timestamp order
             cursor.execute("""
-                CREATE TABLE chat_history (
+                CREATE INDEX IF NOT EXISTS idx_token_usage_user_ts
+                ON token_usage(user_id, timestamp DESC)
+            """)
+
+            # Add cached_tokens to token_usage tables created before it existed
+            cursor.execute("PRAGMA table_info(token_usage)")
+            if "cached_tokens" not in {row[1] for row in cursor.fetchall()}:
+                cursor.execute(
+                    "ALTER TABLE token_usage ADD COLUMN cached_tokens INTEGER DEFAULT 0"
+                )
+            
+            # Chat history table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chat_history (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     user_id TEXT NOT NULL,
                     thread_id TEXT NOT NULL,
@@ -68,15 +130,10 @@ class TokenTracker:
                 )
             """)
 
-            # Restore existing data if any, with image_url set to NULL
-            if existing_data:
-                cursor.executemany("""
-                    INSERT INTO chat_history 
-                    (user_id, thread_id, role, content, response_type, 
-                     chart_type, table_data, source, image_url)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)
-                """, [(row[1], row[2], row[3], row[4], row[5], 
-                      row[6], row[7], row[8]) for row in existing_data])
+            # Add image_url to chat_history tables created before it existed
+            cursor.execute("PRAGMA table_info(chat_history)")
+            if "image_url" not in {row[1] for row in cursor.fetchall()}:
+                cursor.execute("ALTER TABLE chat_history ADD COLUMN image_url TEXT")
             
             # Create index for better performance
             cursor.execute("""
@@ -86,47 +143,101 @@ class TokenTracker:
             
             self.conn.commit()
             logger.info("Token tracking and chat history tables initialized")
+            return True
         except Exception as e:
             logger.error(f"Error initializing tracking tables: {e}")
+            return False
 
-    def save_token_usage(self, user_id: str, thread_id: str, input_tokens: int, output_tokens: int):
-        """Save token usage to database (without query text for privacy)."""
-        try:
-            total_tokens = input_tokens + output_tokens
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                INSERT INTO token_usage (user_id, thread_id, input_tokens, output_tokens, total_tokens)
-                VALUES (?, ?, ?, ?, ?)
-            """, (user_id, thread_id, input_tokens, output_tokens, total_tokens))
-            self.conn.commit()
-            logger.info(f"Token usage saved - User: {user_id}, Thread: {thread_id}, Total: {total_tokens}")
-        except Exception as e:
-            logger.error(f"Error saving token usage: {e}")
+    def save_token_usage(self, user_id: str, thread_id: str, input_tokens: int, output_tokens: int,
+                         cached_tokens: int = 0):
+        """Queue token usage for the background writer (without query text for privacy)."""
+        total_tokens = input_tokens + output_tokens
+        self._pending_usage.put((
+            user_id, thread_id, input_tokens, output_tokens,
+            total_tokens, cached_tokens, _utc_timestamp()
+        ))
+        logger.info(
+            f"Token usage queued - User: {user_id}, Thread: {thread_id}, "
+            f"Total: {total_tokens}, Cached: {cached_tokens}"
+        )
+
+    @staticmethod
+    def _drain(pending: "queue.SimpleQueue[tuple]") -> List[tuple]:
+        """Take every row currently queued."""
+        rows = []
+        while True:
+            try:
+                rows.append(pending.get_nowait())
+            except queue.Empty:
+                return rows
+
+    def flush(self) -> int:
+        """Write all queued token usage and chat rows in one transaction and return how many were written."""
+        with self._flush_lock:
+            usage_rows = self._retry_usage + self._drain(self._pending_usage)
+            chat_rows = self._retry_chat + self._drain(self._pending_chat)
+            self._retry_usage, self._retry_chat = [], []
+            if not usage_rows and not chat_rows:
+                return 0
+
+            conn = None
+            try:
+                conn = self.conn
+                if usage_rows:
+                    conn.executemany(_INSERT_TOKEN_SQL, usage_rows)
+                if chat_rows:
+                    conn.executemany(_INSERT_CHAT_SQL, chat_rows)
+                conn.commit()
+                logger.info(
+                    f"Tracking flushed - {len(usage_rows)} token rows, "
+                    f"{len(chat_rows)} chat messages"
+                )
+                return len(usage_rows) + len(chat_rows)
+            except Exception as e:
+                if conn is not None:
+                    conn.rollback()
+                if isinstance(e, sqlite3.OperationalError):
+                    # Transient, e.g. "database is locked": keep the rows for the next flush
+                    self._retry_usage, self._retry_chat = usage_rows, chat_rows
+                    logger.error(
+                        f"Error flushing token usage and chat messages, "
+                        f"{len(usage_rows) + len(chat_rows)} rows kept for retry: {e}"
+                    )
+                else:
+                    logger.error(f"Error flushing token usage and chat messages: {e}")
+                return 0
+
+    def _flush_loop(self, interval: float):
+        """Periodically flush queued rows until the process exits."""
+        while True:
+            time.sleep(interval)
+            self.flush()
 
     def get_user_token_stats(self, user_id: str) -> Dict[str, Any]:
         """Get token usage statistics for a specific user."""
+        self.flush()
         try:
             cursor = self.conn.cursor()
             cursor.execute("""
                 SELECT 
                     COUNT(*) as total_queries,
-                    SUM(input_tokens) as total_input_tokens,
-                    SUM(output_tokens) as total_output_tokens,
-                    SUM(total_tokens) as total_tokens,
-                    AVG(total_tokens) as avg_tokens_per_query
+                    COALESCE(SUM(input_tokens), 0) as total_input_tokens,
+                    COALESCE(SUM(output_tokens), 0) as total_output_tokens,
+                    COALESCE(SUM(total_tokens), 0) as total_tokens,
+                    COALESCE(ROUND(AVG(total_tokens), 2), 0) as avg_tokens_per_query
                 FROM token_usage 
                 WHERE user_id = ?
             """, (user_id,))
             
-            result = cursor.fetchone()
-            if result and result[0] > 0:
+            total_queries, input_tokens, output_tokens, total_tokens, avg_tokens = cursor.fetchone()
+            if total_queries > 0:
                 return {
                     "user_id": user_id,
-                    "total_queries": result[0],
-                    "total_input_tokens": result[1] or 0,
-                    "total_output_tokens": result[2] or 0,
-                    "total_tokens": result[3] or 0,
-                    "avg_tokens_per_query": round(result[4] or 0, 2)
+                    "total_queries": total_queries,
+                    "total_input_tokens": input_tokens,
+                    "total_output_tokens": output_tokens,
+                    "total_tokens": total_tokens,
+                    "avg_tokens_per_query": avg_tokens
                 }
             return {"user_id": user_id, "total_queries": 0, "total_tokens": 0}
             
@@ -136,8 +247,10 @@ class TokenTracker:
 
     def get_user_recent_activity(self, user_id: str, limit: int = 10) -> Dict[str, Any]:
         """Get recent token usage activity for a user."""
+        self.flush()
         try:
             cursor = self.conn.cursor()
+            cursor.row_factory = sqlite3.Row
             cursor.execute("""
                 SELECT 
                     thread_id,
@@ -151,16 +264,7 @@ class TokenTracker:
                 LIMIT ?
             """, (user_id, limit))
             
-            results = cursor.fetchall()
-            activities = []
-            for row in results:
-                activities.append({
-                    "thread_id": row[0],
-                    "input_tokens": row[1],
-                    "output_tokens": row[2],
-                    "total_tokens": row[3],
-                    "timestamp": row[4]
-                })
+            activities = [dict(row) for row in cursor.fetchall()]
             
             return {
                 "user_id": user_id,
@@ -175,77 +279,92 @@ class TokenTracker:
     def save_chat_message(self, user_id: str, thread_id: str, role: str, content: str, 
                          response_type: str = "text", chart_type: str = None, 
                          table_data: str = None, source: str = None, image_url: str = None):
-        """Save a chat message to the database."""
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                INSERT INTO chat_history 
-                (user_id, thread_id, role, content, response_type, chart_type, 
-                table_data, source, image_url)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (user_id, thread_id, role, content, response_type, chart_type, 
-                 table_data, source, image_url))
-            self.conn.commit()
-            logger.info(f"Chat message saved - User: {user_id}, Thread: {thread_id}, Role: {role}")
-        except Exception as e:
-            logger.error(f"Error saving chat message: {e}")
+        """Queue a chat message for the background writer, stamped with the time it was sent."""
+        self._pending_chat.put((user_id, thread_id, role, content, response_type,
+                                chart_type, table_data, source, image_url,
+                                _utc_timestamp()))
+        logger.info(f"Chat message queued - User: {user_id}, Thread: {thread_id}, Role: {role}")
+        if self._pending_chat.qsize() >= CHAT_FLUSH_BATCH:
+            self.flush()
+
+    def get_chat_history(self, user_id: str, thread_id: str, limit: int = 50,
+                         response_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get chat history for a user and thread, optionally only messages of one response type."""
+        return list(self.iter_chat_history(user_id, thread_id, limit, response_type))
 
-    def get_chat_history(self, user_id: str, thread_id: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get chat history for a user and thread."""
+    def iter_chat_history(self, user_id: str, thread_id: str, limit: int = 50,
+                          response_type: Optional[str] = None,
+                          decode_tables: bool = True) -> Iterator[Dict[str, Any]]:
+        """Yield chat history messages in batches of CHAT_HISTORY_BATCH rows.
+
+        With decode_tables=False, table_data is left as its stored JSON string.
+        """
+        self.flush()
         try:
             cursor = self.conn.cursor()
+            cursor.row_factory = sqlite3.Row
             cursor.execute("""
                 SELECT role, content, response_type, chart_type, 
                        table_data, source, timestamp, image_url
                 FROM chat_history 
                 WHERE user_id = ? AND thread_id = ?
-                ORDER BY timestamp ASC
+                  AND (? IS NULL OR response_type = ?)
+                ORDER BY timestamp ASC, id ASC
                 LIMIT ?
-            """, (user_id, thread_id, limit))
-            
-            results = cursor.fetchall()
-            history = []
-            for row in results:
-                # Base message structure
-                message = {
-                    "role": row[0],
-                    "content": row[1],
-                    "timestamp": row[6]
-                }
-                
-                # Set response type if present
-                if row[2]:  # response_type
-                    message["response_type"] = row[2]
-                
-                # Handle image URL
-                if row[7] and row[7].strip():  # Valid image URL exists
-                    message["image_url"] = row[7]
-                
-                # Add optional fields if they exist
-                if row[3]:  # chart_type
-                    message["chart_type"] = row[3]
-                if row[4]:  # table_data
-                    import json
-                    try:
-                        message["table_data"] = json.loads(row[4])
-                    except json.JSONDecodeError:
-                        pass
-                if row[5] and row[5].strip():  # source
-                    message["source"] = row[5]
-                
-                history.append(message)
+            """, (user_id, thread_id, response_type, response_type, limit))
             
-            return history
+            while True:
+                rows = cursor.fetchmany(CHAT_HISTORY_BATCH)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._row_to_message(row, decode_tables)
             
         except Exception as e:
             logger.error(
                 f"Error fetching chat history - "
                 f"user: {user_id}, thread: {thread_id} - {e}"
             )
-            return []
+
+    @staticmethod
+    def _row_to_message(row: sqlite3.Row, decode_tables: bool = True) -> Dict[str, Any]:
+        """Build a chat message dict from a chat_history row, keeping only fields that are set."""
+        # Base message structure
+        message = {
+            "role": row["role"],
+            "content": row["content"],
+            "timestamp": row["timestamp"]
+        }
+        
+        # Set response type if present
+        if row["response_type"]:
+            message["response_type"] = row["response_type"]
+        
+        # Handle image URL
+        image_url = row["image_url"]
+        if image_url and image_url.strip():  # Valid image URL exists
+            message["image_url"] = image_url
+        
+        # Add optional fields if they exist
+        if row["chart_type"]:
+            message["chart_type"] = row["chart_type"]
+        if row["table_data"]:
+            if not decode_tables:
+                message["table_data"] = row["table_data"]
+            else:
+                try:
+                    message["table_data"] = orjson.loads(row["table_data"])
+                except orjson.JSONDecodeError:
+                    pass
+        source = row["source"]
+        if source and source.strip():
+            message["source"] = source
+        
+        return message
 
     def clear_chat_history(self, user_id: str, thread_id: str):
         """Clear chat history for a specific user and thread."""
+        self.flush()
         try:
             cursor = self.conn.cursor()
             cursor.execute("""
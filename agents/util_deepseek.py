@@ -1,24 +1,84 @@
 """Utilities for handling Deepseek model responses and tool calls."""
 
 import re
-import json
+import orjson
+from functools import lru_cache
 from loguru import logger
 from langchain_core.messages import AIMessage
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, NamedTuple
 
+# Single pass detector for every Deepseek marker
+_DEEPSEEK_MARKER_RE = re.compile(r"\[TOOL_REQUEST\]|<think>|\[TOOL_RESULT\]")
 
-def parse_deepseek_tool_calls(content: str) -> List[Dict[str, Any]]:
+# Tool call delimiters and the blocks stripped from displayed content
+_TOOL_REQ_OPEN = '[TOOL_REQUEST]'
+_TOOL_REQ_CLOSE = '[END_TOOL_REQUEST]'
+_TOOL_REQ_STRIP_RE = re.compile(r'\[TOOL_REQUEST\].*?\[END_TOOL_REQUEST\]', re.DOTALL)
+_TOOL_RES_RE = re.compile(r'\[TOOL_RESULT\].*?\[END_TOOL_RESULT\]', re.DOTALL)
+_THINK_RE = re.compile(r'<think>.*?</think>', re.DOTALL)
+_WS_RE = re.compile(r'\n\s*\n')
+
+# Responses shorter than this are memoized; longer ones are parsed uncached
+_CACHE_MAX_CONTENT = 16384
+
+
+class ContentInfo(NamedTuple):
+    """Deepseek markers found in one scan of a response."""
+    has_tool_request: bool
+    has_think: bool
+    has_tool_result: bool
+    tool_request_start: int  # offset of the first [TOOL_REQUEST], -1 when absent
+
+    @property
+    def has_markers(self) -> bool:
+        return self.has_tool_request or self.has_think or self.has_tool_result
+
+
+def inspect_content(content: str) -> ContentInfo:
+    """Scan content once and report which Deepseek markers it contains."""
+    found = {}
+    for match in _DEEPSEEK_MARKER_RE.finditer(content):
+        found.setdefault(match.group(), match.start())
+        if len(found) == 3:
+            break
+    return ContentInfo(
+        has_tool_request='[TOOL_REQUEST]' in found,
+        has_think='<think>' in found,
+        has_tool_result='[TOOL_RESULT]' in found,
+        tool_request_start=found.get('[TOOL_REQUEST]', -1)
+    )
+
+
+def parse_deepseek_tool_calls(content: str, start: int = 0) -> List[Dict[str, Any]]:
     """Parse Deepseek's custom tool call format and convert to LangChain format."""
+    if len(content) < _CACHE_MAX_CONTENT:
+        tool_calls = _parse_tool_calls_cached(content, start)
+    else:
+        tool_calls = _parse_tool_calls(content, start)
+    # Hand out fresh dicts so callers never mutate a cached result
+    return [{**call, "args": dict(call["args"])} for call in tool_calls]
+
+
+def _parse_tool_calls(content: str, start: int) -> List[Dict[str, Any]]:
+    """Scan content for Deepseek tool requests."""
     tool_calls = []
     
-    # Pattern to match [TOOL_REQUEST]...json...[END_TOOL_REQUEST]
-    pattern = r'\[TOOL_REQUEST\]\s*(\{.*?\})\s*\[END_TOOL_REQUEST\]'
-    matches = re.findall(pattern, content, re.DOTALL)
-    
-    for i, match in enumerate(matches):
+    # Scan for [TOOL_REQUEST]...json...[END_TOOL_REQUEST] without backtracking
+    pos = start
+    i = 0
+    while True:
+        begin = content.find(_TOOL_REQ_OPEN, pos)
+        if begin < 0:
+            break
+        end = content.find(_TOOL_REQ_CLOSE, begin)
+        if end < 0:
+            break
+        payload = content[begin + len(_TOOL_REQ_OPEN):end].strip()
+        pos = end + len(_TOOL_REQ_CLOSE)
+        
         try:
             # Parse the JSON tool request
-            tool_data = json.loads(match.strip())
+            tool_data = orjson.loads(payload)
             
             # Convert to LangChain tool call format
             tool_call = {
@@ -28,53 +88,88 @@ def parse_deepseek_tool_calls(content: str) -> List[Dict[str, Any]]:
             }
             tool_calls.append(tool_call)
             
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse tool call JSON: {match}, error: {e}")
-            continue
+        except (ValueError, TypeError, KeyError) as e:
+            # Invalid JSON (orjson.JSONDecodeError is a ValueError), a non-object payload or no name
+            logger.error(f"Failed to parse tool call JSON: {payload}, error: {e}")
+        i += 1
     
     return tool_calls
 
 
-def clean_deepseek_content(content: str) -> str:
+@lru_cache(maxsize=512)
+def _parse_tool_calls_cached(content: str, start: int) -> tuple:
+    """Memoized _parse_tool_calls for short, repeated responses."""
+    return tuple(_parse_tool_calls(content, start))
+
+
+def clean_deepseek_content(content: str, info: Optional[ContentInfo] = None) -> str:
     """Remove tool request markers, tool results, and thinking blocks from content for cleaner display."""
+    if len(content) < _CACHE_MAX_CONTENT:
+        return _clean_content_cached(content, info)
+    return _clean_content(content, info)
+
+
+def _clean_content(content: str, info: Optional[ContentInfo]) -> str:
+    """Strip Deepseek blocks from content."""
+    if info is None:
+        info = inspect_content(content)
+    if not info.has_markers:
+        return content
+    cleaned = content
+    removed = 0
+
     # Remove [TOOL_REQUEST]....[END_TOOL_REQUEST] blocks
-    pattern = r'\[TOOL_REQUEST\].*?\[END_TOOL_REQUEST\]'
-    cleaned = re.sub(pattern, '', content, flags=re.DOTALL)
+    if info.has_tool_request:
+        cleaned, count = _TOOL_REQ_STRIP_RE.subn('', cleaned)
+        removed += count
     
     # Remove [TOOL_RESULT]....[END_TOOL_RESULT] blocks
-    tool_result_pattern = r'\[TOOL_RESULT\].*?\[END_TOOL_RESULT\]'
-    cleaned = re.sub(tool_result_pattern, '', cleaned, flags=re.DOTALL)
+    if info.has_tool_result:
+        cleaned, count = _TOOL_RES_RE.subn('', cleaned)
+        removed += count
     
     # Remove <think>...</think> blocks
-    think_pattern = r'<think>.*?</think>'
-    cleaned = re.sub(think_pattern, '', cleaned, flags=re.DOTALL)
+    if info.has_think:
+        cleaned, count = _THINK_RE.subn('', cleaned)
+        removed += count
     
-    # Clean up extra whitespace and newlines
-    cleaned = re.sub(r'\n\s*\n', '\n', cleaned.strip())
+    # Clean up extra whitespace and newlines left by removed blocks
+    if removed:
+        cleaned = _WS_RE.sub('\n', cleaned.strip())
     
     return cleaned
 
 
-def process_deepseek_response(response: AIMessage) -> AIMessage:
+_clean_content_cached = lru_cache(maxsize=512)(_clean_content)
+
+
+def process_deepseek_response(response: AIMessage, info: Optional[ContentInfo] = None) -> AIMessage:
     """Process a Deepseek response to handle tool calls and clean content."""
     if not hasattr(response, 'content'):
         return response
     
     content = response.content
+    if not isinstance(content, str):
+        return response
+
+    if info is None:
+        info = inspect_content(content)
+    if not info.has_markers:
+        return response
     
     # Check if this is a Deepseek model response with custom tool format
-    if '[TOOL_REQUEST]' in content:
+    if info.has_tool_request:
         logger.info("Detected Deepseek tool call format, parsing...")
         logger.info(f"Original content: {content}")
         
-        # Parse Deepseek's tool calls
-        tool_calls = parse_deepseek_tool_calls(content)
+        # Parse Deepseek's tool calls from the first request marker on
+        tool_calls = parse_deepseek_tool_calls(content, info.tool_request_start)
         
         if tool_calls:
             logger.info(f"Parsed {len(tool_calls)} tool calls: {tool_calls}")
             
             # Clean the content by removing tool request markers and think blocks
-            cleaned_content = clean_deepseek_content(content)
+            cleaned_content = clean_deepseek_content(content, info)
             
             # Create a new message with proper tool calls and cleaned content
             response = AIMessage(
@@ -84,9 +179,9 @@ def process_deepseek_response(response: AIMessage) -> AIMessage:
             logger.info(f"Created new message with tool calls: {response.tool_calls}")
     
     # Also clean content for responses without tool calls but with think blocks or tool results
-    elif '<think>' in content or '[TOOL_RESULT]' in content:
+    else:
         logger.info("Detected Deepseek thinking blocks or tool results, cleaning...")
-        cleaned_content = clean_deepseek_content(content)
+        cleaned_content = clean_deepseek_content(content, info)
         response = AIMessage(content=cleaned_content)
         logger.info("Cleaned thinking blocks and tool results from content")
     
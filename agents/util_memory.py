@@ -5,26 +5,26 @@ from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 from langgraph.checkpoint.sqlite import SqliteSaver
 import sqlite3
 from typing import Dict, Any, List
+from ._db import ConnectionSource, as_connection_factory
 
 
 class MemoryManager:
     """Manages conversation memory and history for the chatbot."""
     
-    def __init__(self, checkpointer: SqliteSaver, conn: sqlite3.Connection):
-        """Initialize the memory manager."""
+    def __init__(self, checkpointer: SqliteSaver, conn: ConnectionSource):
+        """Initialize the memory manager with a connection or per-thread connection factory."""
         self.checkpointer = checkpointer
-        self.conn = conn
+        self._get_conn = as_connection_factory(conn) if conn is not None else None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Database connection for the calling thread."""
+        return self._get_conn()
     
     def clear_memory(self, thread_id: str = "default", user_id: str = None) -> Dict[str, Any]:
         """Clear conversation history for a specific thread."""
         try:
-            # Use the same database connection that the checkpointer uses
-            cursor = self.conn.cursor()
-            
-            # Clear all checkpoints for this specific thread_id
-            cursor.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
-            self.conn.commit()
-            
+            self._delete_threads([(thread_id,)])
             logger.info(f"Cleared conversation history for thread: {thread_id}, user: {user_id}")
             return {"status": "success", "thread_id": thread_id, "user_id": user_id}
             
@@ -32,6 +32,26 @@ class MemoryManager:
             logger.error(f"Error clearing memory for thread {thread_id}, user {user_id}: {e}")
             return {"status": "error", "message": str(e)}
 
+    def clear_memory_many(self, thread_ids: List[str]) -> Dict[str, Any]:
+        """Clear conversation history for several threads in one transaction."""
+        try:
+            self._delete_threads([(thread_id,) for thread_id in thread_ids])
+            logger.info(f"Cleared conversation history for {len(thread_ids)} threads")
+            return {"status": "success", "thread_ids": list(thread_ids)}
+            
+        except Exception as e:
+            logger.error(f"Error clearing memory for threads {thread_ids}: {e}")
+            return {"status": "error", "message": str(e)}
+
+    def _delete_threads(self, params: List[tuple]):
+        """Delete checkpoints and their pending writes for the given threads."""
+        # Checkpoints live in the same database file as the checkpointer's connection.
+        # thread_id leads both tables' primary keys, so these are index lookups.
+        conn = self.conn
+        conn.executemany("DELETE FROM checkpoints WHERE thread_id = ?", params)
+        conn.executemany("DELETE FROM checkpoint_writes WHERE thread_id = ?", params)
+        conn.commit()
+
     def get_memory_stats(self, thread_id: str = "default", user_id: str = None) -> Dict[str, Any]:
         """Get statistics about conversation history for a thread."""
         try:
@@ -46,12 +66,22 @@ class MemoryManager:
             checkpoint_tuple = self.checkpointer.get_tuple(thread_config)
             if checkpoint_tuple and checkpoint_tuple.checkpoint:
                 messages = checkpoint_tuple.checkpoint.get("channel_values", {}).get("messages", [])
+                
+                # Count both roles in one pass over the thread's messages
+                user_messages = ai_messages = 0
+                for message in messages:
+                    message_type = type(message)
+                    if message_type is HumanMessage:
+                        user_messages += 1
+                    elif message_type is AIMessage:
+                        ai_messages += 1
+                
                 return {
                     "thread_id": thread_id,
                     "user_id": user_id,
                     "total_messages": len(messages),
-                    "user_messages": len([m for m in messages if isinstance(m, HumanMessage)]),
-                    "ai_messages": len([m for m in messages if isinstance(m, AIMessage)]),
+                    "user_messages": user_messages,
+                    "ai_messages": ai_messages,
                     "storage": "SQLite",
                     "status": "active" if messages else "empty"
                 }
@@ -76,21 +106,16 @@ class MemoryManager:
     def load_conversation_history(self, user_id: str, thread_id: str, token_tracker, limit: int = 20) -> List[BaseMessage]:
         """Load conversation history from SQLite and convert to LangChain messages."""
         try:
-            # Get chat history from database (only text messages for context)
-            history = token_tracker.get_chat_history(user_id, thread_id, limit * 2)  # Get more to account for filtering
+            # Get only text messages from the database for conversation context
+            history = token_tracker.get_chat_history(user_id, thread_id, limit, response_type="text")
             
             messages = []
-            text_message_count = 0
-            
             for record in history:
-                # Only include text messages for conversation context
-                if record.get("response_type") == "text" and text_message_count < limit:
-                    if record["role"] == "user":
-                        messages.append(HumanMessage(content=record["content"]))
-                        text_message_count += 1
-                    elif record["role"] == "assistant":
-                        messages.append(AIMessage(content=record["content"]))
-                        text_message_count += 1
+                role = record["role"]
+                if role == "user":
+                    messages.append(HumanMessage(content=record["content"]))
+                elif role == "assistant":
+                    messages.append(AIMessage(content=record["content"]))
             
             logger.info(f"Loaded {len(messages)} text messages from chat history for thread {thread_id}")
             return messages
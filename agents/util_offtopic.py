@@ -0,0 +1,79 @@
+"""Off-topic gate so obvious non-campaign queries are answered without an LLM call."""
+
+import os
+import re
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+# Cosine similarity above which a query counts as a known off-topic request
+OFFTOPIC_THRESHOLD = float(os.getenv("OFFTOPIC_THRESHOLD", "0.75"))
+
+OFFTOPIC_MESSAGE = (
+    "I am a Campaign Analytics Assistant. I can only provide "
+    "information about campaign performance data."
+)
+
+# Canonical requests the assistant always declines
+_REJECTION_PHRASES = (
+    "tell me a joke",
+    "how are you today?",
+    "how are you doing",
+    "what's up",
+    "good morning",
+    "what is the weather like",
+    "what's the weather tomorrow",
+    "write me a poem",
+    "write a story",
+    "sing me a song",
+    "who are you",
+    "what is your name",
+    "what is the meaning of life",
+    "recommend a movie",
+    "what should i eat for dinner",
+    "give me a recipe",
+    "who won the game last night",
+    "what's the latest news",
+    "translate this sentence",
+    "help me with my homework",
+)
+
+# Near-free pre-filters: campaign vocabulary always goes to the agent,
+# obvious small talk never does
+_CAMPAIGN_RE = re.compile(
+    r"\b(campaigns?|conversions?|opens?|clicks?|rates?|segments?|audience|topics?|"
+    r"metrics?|charts?|reports?|images?|assets?|performance|summary|compare|top)\b|\d",
+    re.IGNORECASE
+)
+_OFFTOPIC_RE = re.compile(
+    r"\b(jokes?|poems?|weather|recipes?|songs?|movies?|horoscope)\b",
+    re.IGNORECASE
+)
+
+
+class OffTopicClassifier:
+    """Flags small talk by nearest-neighbour similarity to canonical rejection phrases."""
+
+    def __init__(self, embeddings, threshold: float = OFFTOPIC_THRESHOLD):
+        """Embed the rejection phrases once with the given LangChain embeddings."""
+        self.embeddings = embeddings
+        self.threshold = threshold
+        try:
+            matrix = np.asarray(
+                embeddings.embed_documents(list(_REJECTION_PHRASES)), dtype=np.float32
+            )
+            self._phrases = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+        except Exception as e:
+            logger.error(f"Error embedding off-topic phrases, using keyword gate only: {e}")
+            self._phrases = None
+
+    def is_off_topic(self, user_query: str, query_embedding: Optional[np.ndarray] = None) -> bool:
+        """Whether a query is clearly off-topic; query_embedding must be L2-normalized."""
+        if _CAMPAIGN_RE.search(user_query):
+            return False
+        if _OFFTOPIC_RE.search(user_query):
+            return True
+        if self._phrases is None or query_embedding is None:
+            return False
+        return float((self._phrases @ query_embedding).max()) > self.threshold
@@ -1,16 +1,25 @@
 # api/main.py
-from fastapi import FastAPI, HTTPException, Request, Depends, status
+from fastapi import FastAPI, HTTPException, Request, Depends, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 import uvicorn
 from loguru import logger
 import sqlite3
+import queue
+import hmac
+from types import MappingProxyType
+import threading
+import orjson
+from functools import lru_cache
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import os
 from dotenv import load_dotenv
+from cachetools import TTLCache
 import sys
 
 # Add parent directory to path to import configs
@@ -22,6 +31,20 @@ load_dotenv()
 
 # Use centralized database configuration
 DB_PATH = SQLiteConfig.get_campaigns_db()
+DB_POOL_SIZE = int(os.getenv("API_DB_POOL_SIZE", "8"))
+STREAM_BATCH_SIZE = int(os.getenv("API_STREAM_BATCH_SIZE", "500"))  # rows per streamed chunk
+API_CACHE_TTL = int(os.getenv("API_CACHE_TTL", "60"))  # seconds
+
+# Read-only analytics responses, keyed by endpoint and parameters
+_RESPONSE_CACHE = TTLCache(maxsize=256, ttl=API_CACHE_TTL)
+_RESPONSE_CACHE_LOCK = threading.Lock()
+
+# Applied to every pooled connection
+_DB_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA cache_size=-65536;
+    PRAGMA mmap_size=268435456;
+"""
 
 # Security
 security = HTTPBearer()
@@ -50,6 +73,15 @@ for key in ENV_API_KEYS:
             "active": True
         }
 
+# Keys are fixed after startup: freeze them and precompute the active set
+VALID_API_KEYS = MappingProxyType(VALID_API_KEYS)
+_ACTIVE_KEYS = frozenset(key for key, info in VALID_API_KEYS.items() if info["active"])
+
+# Active keys allowed to call the /admin endpoints; none unless configured
+_ADMIN_KEYS = frozenset(
+    key.strip() for key in os.getenv("API_ADMIN_KEYS", "").split(",")
+) & _ACTIVE_KEYS
+
 # Configure centralized logging
 setup_logger(logger, LogConfig.get_api_log(), LogConfig.API_FORMAT)
 logger.add(
@@ -67,6 +99,7 @@ app = FastAPI(
     title="Campaign Performance API",
     description="Campaign Performance API v2.0 - Secure REST API for campaign data with authentication and rate limiting. Test API Key: sk-test-1234567890abcdef",
     version="2.0.0",
+    default_response_class=ORJSONResponse,
     contact={
         "name": "Campaign Performance API Support",
         "email": "support@campaign-api.com",
@@ -85,6 +118,7 @@ app = FastAPI(
         {"name": "campaigns", "description": "Campaign data and analytics endpoints"},
         {"name": "analytics", "description": "Summary statistics and top performers"},
         {"name": "comparison", "description": "Campaign comparison endpoints"},
+        {"name": "admin", "description": "Maintenance endpoints (admin keys only)"},
     ]
 )
 
@@ -135,15 +169,77 @@ class APIKeyInfo(BaseModel):
     rate_limit: str
     active: bool
 
+def _open_database_connection() -> sqlite3.Connection:
+    """Open a tuned connection to the campaigns database."""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.executescript(_DB_PRAGMAS)
+    conn.row_factory = sqlite3.Row  # rows convert straight to dicts
+    return conn
+
+# Long-lived connections shared by all requests, so the page cache stays warm.
+# They are opened on first demand, up to DB_POOL_SIZE, rather than at import.
+_CONN_POOL: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+_CONN_POOL_LOCK = threading.Lock()
+_conn_pool_opened = 0
+
+def _acquire_connection() -> sqlite3.Connection:
+    """Take an idle pooled connection, opening one if the pool is not yet full; blocks otherwise."""
+    global _conn_pool_opened
+    try:
+        return _CONN_POOL.get_nowait()
+    except queue.Empty:
+        pass
+    with _CONN_POOL_LOCK:
+        if _conn_pool_opened < DB_POOL_SIZE:
+            conn = _open_database_connection()
+            _conn_pool_opened += 1
+            return conn
+    return _CONN_POOL.get()
+
 def get_database_connection():
-    """Get a database connection."""
-    return sqlite3.connect(DB_PATH)
+    """Lend a pooled database connection for the duration of a request."""
+    conn = _acquire_connection()
+    try:
+        yield conn
+    finally:
+        _CONN_POOL.put(conn)
+
+@app.on_event("startup")
+def create_campaign_indexes():
+    """Add the campaign sort indexes to databases set up before they existed."""
+    conn = _acquire_connection()
+    try:
+        SQLiteConfig.ensure_campaign_indexes(conn)
+    except Exception as e:
+        logger.error(f"Error creating campaign indexes: {e}")
+    finally:
+        _CONN_POOL.put(conn)
+
+@lru_cache(maxsize=1024)
+def _lookup_api_key(api_key: str) -> Optional[dict]:
+    """Find an API key's info using constant-time comparisons; None if unknown."""
+    match = None
+    for key, info in VALID_API_KEYS.items():
+        if hmac.compare_digest(key.encode(), api_key.encode()):
+            match = info
+    return match
+
+def _cache_get(key: tuple):
+    """Return a cached response, or None on a miss."""
+    with _RESPONSE_CACHE_LOCK:
+        return _RESPONSE_CACHE.get(key)
+
+def _cache_set(key: tuple, value):
+    """Cache a response for API_CACHE_TTL seconds."""
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE[key] = value
 
 def verify_api_key(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify the API key from the Authorization header."""
     api_key = credentials.credentials
     
-    if api_key not in VALID_API_KEYS:
+    api_key_info = _lookup_api_key(api_key)
+    if api_key_info is None:
         logger.warning(f"Invalid API key attempted: {api_key[:8]}...")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -151,8 +247,7 @@ def verify_api_key(credentials: HTTPAuthorizationCredentials = Depends(security)
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    api_key_info = VALID_API_KEYS[api_key]
-    if not api_key_info["active"]:
+    if api_key not in _ACTIVE_KEYS:
         logger.warning(f"Inactive API key attempted: {api_key[:8]}...")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -160,7 +255,18 @@ def verify_api_key(credentials: HTTPAuthorizationCredentials = Depends(security)
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    logger.info(f"Valid API key used: {api_key_info['name']}")
+    logger.debug(f"Valid API key used: {api_key_info['name']}")
+    return api_key_info
+
+def verify_admin_key(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Verify the API key and require it to be listed in API_ADMIN_KEYS."""
+    api_key_info = verify_api_key(credentials)
+    if credentials.credentials not in _ADMIN_KEYS:
+        logger.warning(f"Non-admin API key attempted admin endpoint: {api_key_info['name']}")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin API key required"
+        )
     return api_key_info
 
 @app.get("/")
@@ -206,7 +312,8 @@ async def verify_auth(api_key_info: APIKeyInfo = Depends(verify_api_key)):
 @limiter.limit("60/minute")
 async def get_campaign_summary_stats(
     request: Request,
-    api_key_info: APIKeyInfo = Depends(verify_api_key)
+    api_key_info: APIKeyInfo = Depends(verify_api_key),
+    conn: sqlite3.Connection = Depends(get_database_connection)
 ):
     """
     Get summary statistics for all campaigns.
@@ -216,40 +323,30 @@ async def get_campaign_summary_stats(
     """
     logger.info(f"API: Getting campaign summary statistics (API Key: {api_key_info['name']})")
     
-    conn = get_database_connection()
+    cached = _cache_get(("summary",))
+    if cached is not None:
+        return cached
+    
     try:
-        # Get various summary stats
-        total_campaigns = conn.execute(
-            "SELECT COUNT(*) FROM campaigns"
-        ).fetchone()[0]
-        avg_conversion = conn.execute(
-            "SELECT AVG(conversion_rate) FROM campaigns"
-        ).fetchone()[0]
-        avg_open_rate = conn.execute(
-            "SELECT AVG(open_rate) FROM campaigns"
-        ).fetchone()[0]
-        avg_click_rate = conn.execute(
-            "SELECT AVG(click_rate) FROM campaigns"
-        ).fetchone()[0]
-        total_conversions = conn.execute(
-            "SELECT SUM(conversions) FROM campaigns"
-        ).fetchone()[0]
-        total_opens = conn.execute(
-            "SELECT SUM(opens) FROM campaigns"
-        ).fetchone()[0]
-        total_clicks = conn.execute(
-            "SELECT SUM(clicks) FROM campaigns"
-        ).fetchone()[0]
+        # Get every summary stat in a single scan
+        (total_campaigns, avg_conversion, avg_open_rate, avg_click_rate,
+         total_conversions, total_opens, total_clicks) = conn.execute("""
+            SELECT COUNT(*), AVG(conversion_rate), AVG(open_rate), AVG(click_rate),
+                   SUM(conversions), SUM(opens), SUM(clicks)
+            FROM campaigns
+        """).fetchone()
         
-        return SummaryStatsResponse(
+        stats = SummaryStatsResponse(
             total_campaigns=total_campaigns,
-            average_conversion_rate=round(avg_conversion, 2),
-            average_open_rate=round(avg_open_rate, 2),
-            average_click_rate=round(avg_click_rate, 2),
-            total_conversions=total_conversions,
-            total_opens=total_opens,
-            total_clicks=total_clicks
+            average_conversion_rate=round(avg_conversion or 0, 2),
+            average_open_rate=round(avg_open_rate or 0, 2),
+            average_click_rate=round(avg_click_rate or 0, 2),
+            total_conversions=total_conversions or 0,
+            total_opens=total_opens or 0,
+            total_clicks=total_clicks or 0
         )
+        _cache_set(("summary",), stats)
+        return stats
         
     except Exception as e:
         logger.error(f"Database error: {e}")
@@ -257,16 +354,30 @@ async def get_campaign_summary_stats(
             status_code=500,
             detail=f"Error retrieving summary stats: {str(e)}"
         )
-    finally:
-        conn.close()
+
+# One fixed statement per valid metric, so sqlite3's statement cache reuses them
+_TOP_STMTS = {
+    metric: f"""
+            SELECT campaign_id, campaign_topic, customer_segment, 
+                   conversion_rate, opens, clicks, conversions
+            FROM campaigns 
+            ORDER BY {metric} DESC 
+            LIMIT ?
+        """
+    for metric in (
+        'conversion_rate', 'open_rate', 'click_rate',
+        'opens', 'clicks', 'conversions'
+    )
+}
 
 @app.get("/campaigns/top/{metric}", response_model=TopCampaignsResponse, tags=["analytics"])
 @limiter.limit("50/minute")
 async def get_top_campaigns_by_metric(
     request: Request,
     metric: str,
-    limit: int = 5,
-    api_key_info: APIKeyInfo = Depends(verify_api_key)
+    limit: int = Query(5, ge=1, le=100),
+    api_key_info: APIKeyInfo = Depends(verify_api_key),
+    conn: sqlite3.Connection = Depends(get_database_connection)
 ):
     """
     Get top performing campaigns by a specific metric.
@@ -275,44 +386,31 @@ async def get_top_campaigns_by_metric(
     """
     logger.info(f"API: Getting top {limit} campaigns by {metric} (API Key: {api_key_info['name']})")
     
-    valid_metrics = [
-        'conversion_rate', 'open_rate', 'click_rate', 
-        'opens', 'clicks', 'conversions'
-    ]
-    if metric not in valid_metrics:
+    query = _TOP_STMTS.get(metric)
+    if query is None:
         raise HTTPException(
             status_code=400,
-            detail=f"Invalid metric. Please use one of: {', '.join(valid_metrics)}"
+            detail=f"Invalid metric. Please use one of: {', '.join(_TOP_STMTS)}"
         )
     
-    conn = get_database_connection()
+    cache_key = ("top", metric, limit)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+    
     try:
-        query = f"""
-            SELECT campaign_id, campaign_topic, customer_segment, 
-                   conversion_rate, opens, clicks, conversions
-            FROM campaigns 
-            ORDER BY {metric} DESC 
-            LIMIT ?
-        """
         results = conn.execute(query, (limit,)).fetchall()
         
-        campaigns = []
-        for row in results:
-            campaigns.append(CampaignSummary(
-                campaign_id=row[0],
-                campaign_topic=row[1],
-                customer_segment=row[2],
-                conversion_rate=row[3],
-                opens=row[4],
-                clicks=row[5],
-                conversions=row[6]
-            ))
+        # Rows come from our own schema, so skip per-field validation
+        campaigns = [CampaignSummary.model_construct(**row) for row in results]
         
-        return TopCampaignsResponse(
+        top = TopCampaignsResponse(
             metric=metric,
             limit=limit,
             campaigns=campaigns
         )
+        _cache_set(cache_key, top)
+        return top
         
     except Exception as e:
         logger.error(f"Database error: {e}")
@@ -320,24 +418,28 @@ async def get_top_campaigns_by_metric(
             status_code=500,
             detail=f"Error retrieving top campaigns: {str(e)}"
         )
-    finally:
-        conn.close()
+
+def _like_pattern(term: str, mode: str) -> str:
+    """LIKE pattern for a search term; prefix patterns can range-seek a NOCASE index."""
+    return f'{term}%' if mode == "prefix" else f'%{term}%'
 
 @app.get("/campaigns/topic/{topic}", tags=["campaigns"])
 @limiter.limit("40/minute")
 async def get_campaigns_by_topic(
     request: Request,
     topic: str,
-    api_key_info: APIKeyInfo = Depends(verify_api_key)
+    mode: Literal["contains", "prefix"] = Query("contains"),
+    api_key_info: APIKeyInfo = Depends(verify_api_key),
+    conn: sqlite3.Connection = Depends(get_database_connection)
 ):
     """
     Get all campaigns for a specific topic.
     
     Searches for campaigns containing the specified topic in their campaign_topic field.
+    Use mode=prefix to match topics starting with it, which can use the topic index.
     """
     logger.info(f"API: Getting campaigns for topic: {topic} (API Key: {api_key_info['name']})")
     
-    conn = get_database_connection()
     try:
         query = """
             SELECT campaign_id, campaign_topic, customer_segment, 
@@ -346,19 +448,10 @@ async def get_campaigns_by_topic(
             WHERE campaign_topic LIKE ?
             ORDER BY conversion_rate DESC
         """
-        results = conn.execute(query, (f'%{topic}%',)).fetchall()
+        results = conn.execute(query, (_like_pattern(topic, mode),)).fetchall()
         
-        campaigns = []
-        for row in results:
-            campaigns.append(CampaignSummary(
-                campaign_id=row[0],
-                campaign_topic=row[1],
-                customer_segment=row[2],
-                conversion_rate=row[3],
-                opens=row[4],
-                clicks=row[5],
-                conversions=row[6]
-            ))
+        # Rows come from our own schema, so skip per-field validation
+        campaigns = [CampaignSummary.model_construct(**row) for row in results]
         
         return {
             "topic": topic,
@@ -372,24 +465,24 @@ async def get_campaigns_by_topic(
             status_code=500,
             detail=f"Error retrieving campaigns: {str(e)}"
         )
-    finally:
-        conn.close()
 
 @app.get("/campaigns/segment/{segment}", tags=["campaigns"])
 @limiter.limit("40/minute")
 async def get_campaigns_by_segment(
     request: Request,
     segment: str,
-    api_key_info: APIKeyInfo = Depends(verify_api_key)
+    mode: Literal["contains", "prefix"] = Query("contains"),
+    api_key_info: APIKeyInfo = Depends(verify_api_key),
+    conn: sqlite3.Connection = Depends(get_database_connection)
 ):
     """
     Get all campaigns for a specific customer segment.
     
     Searches for campaigns targeting the specified customer segment.
+    Use mode=prefix to match segments starting with it, which can use the segment index.
     """
     logger.info(f"API: Getting campaigns for segment: {segment} (API Key: {api_key_info['name']})")
     
-    conn = get_database_connection()
     try:
         query = """
             SELECT campaign_id, campaign_topic, conversion_rate, 
@@ -398,19 +491,9 @@ async def get_campaigns_by_segment(
             WHERE customer_segment LIKE ?
             ORDER BY campaign_date DESC
         """
-        results = conn.execute(query, (f'%{segment}%',)).fetchall()
+        results = conn.execute(query, (_like_pattern(segment, mode),)).fetchall()
         
-        campaigns = []
-        for row in results:
-            campaigns.append({
-                "campaign_id": row[0],
-                "campaign_topic": row[1],
-                "conversion_rate": row[2],
-                "opens": row[3],
-                "clicks": row[4],
-                "conversions": row[5],
-                "campaign_date": row[6]
-            })
+        campaigns = [dict(row) for row in results]
         
         return {
             "segment": segment,
@@ -424,8 +507,6 @@ async def get_campaigns_by_segment(
             status_code=500,
             detail=f"Error retrieving campaigns: {str(e)}"
         )
-    finally:
-        conn.close()
 
 @app.get("/campaigns/compare/{campaign_id1}/{campaign_id2}", tags=["comparison"])
 @limiter.limit("30/minute")
@@ -433,7 +514,8 @@ async def compare_campaigns(
     request: Request,
     campaign_id1: int,
     campaign_id2: int,
-    api_key_info: APIKeyInfo = Depends(verify_api_key)
+    api_key_info: APIKeyInfo = Depends(verify_api_key),
+    conn: sqlite3.Connection = Depends(get_database_connection)
 ):
     """
     Compare two campaigns side by side.
@@ -442,7 +524,6 @@ async def compare_campaigns(
     """
     logger.info(f"API: Comparing campaigns {campaign_id1} and {campaign_id2} (API Key: {api_key_info['name']})")
     
-    conn = get_database_connection()
     try:
         query = """
             SELECT campaign_id, campaign_topic, customer_segment, 
@@ -455,34 +536,10 @@ async def compare_campaigns(
         results = conn.execute(query, (campaign_id1, campaign_id2)).fetchall()
         
         if len(results) == 2:
-            c1, c2 = results[0], results[1]
-            
             return {
                 "comparison": f"{campaign_id1} vs {campaign_id2}",
-                "campaign_1": {
-                    "campaign_id": c1[0],
-                    "campaign_topic": c1[1],
-                    "customer_segment": c1[2],
-                    "conversion_rate": c1[3],
-                    "open_rate": c1[4],
-                    "click_rate": c1[5],
-                    "opens": c1[6],
-                    "clicks": c1[7],
-                    "conversions": c1[8],
-                    "audience_size": c1[9]
-                },
-                "campaign_2": {
-                    "campaign_id": c2[0],
-                    "campaign_topic": c2[1],
-                    "customer_segment": c2[2],
-                    "conversion_rate": c2[3],
-                    "open_rate": c2[4],
-                    "click_rate": c2[5],
-                    "opens": c2[6],
-                    "clicks": c2[7],
-                    "conversions": c2[8],
-                    "audience_size": c2[9]
-                }
+                "campaign_1": dict(results[0]),
+                "campaign_2": dict(results[1])
             }
         else:
             raise HTTPException(
@@ -498,8 +555,6 @@ async def compare_campaigns(
             status_code=500,
             detail=f"Error comparing campaigns: {str(e)}"
         )
-    finally:
-        conn.close()
 
 @app.get("/campaigns/all", tags=["campaigns"])
 @limiter.limit("50/minute")
@@ -514,35 +569,166 @@ async def get_all_campaigns(
     """
     logger.info(f"API: Getting all campaigns (API Key: {api_key_info['name']})")
     
-    conn = get_database_connection()
+    cached = _cache_get(("all",))
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    
+    # The connection is held until the stream finishes, so borrow it here.
+    # Waiting for it and running the query would block the event loop.
+    conn = await run_in_threadpool(_acquire_connection)
     try:
         query = """
             SELECT * FROM campaigns 
             ORDER BY campaign_date DESC
         """
-        results = conn.execute(query).fetchall()
-        
-        # Get column names
-        columns = [description[0] for description in conn.execute(query).description]
-        
-        campaigns = []
-        for row in results:
-            campaign_data = dict(zip(columns, row))
-            campaigns.append(campaign_data)
-        
-        return {
-            "count": len(campaigns),
-            "campaigns": campaigns
-        }
-            
+        cursor = await run_in_threadpool(conn.execute, query)
     except Exception as e:
+        _CONN_POOL.put(conn)
         logger.error(f"Database error: {e}")
         raise HTTPException(
             status_code=500, 
             detail=f"Error retrieving all campaigns: {str(e)}"
         )
+    
+    return StreamingResponse(
+        _stream_campaign_rows(conn, cursor), media_type="application/json"
+    )
+
+
+def _stream_campaign_rows(conn: sqlite3.Connection, cursor: sqlite3.Cursor):
+    """Encode cursor rows as {"campaigns": [...], "count": n} in batches, cache the body, then release the connection."""
+    try:
+        count = 0
+        chunks = [b'{"campaigns":[']
+        yield chunks[0]
+        while True:
+            rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            chunk = b",".join(orjson.dumps(dict(row)) for row in rows)
+            chunks.append(chunk if not count else b"," + chunk)
+            yield chunks[-1]
+            count += len(rows)
+        chunks.append(b'],"count":%d}' % count)
+        yield chunks[-1]
+        # Only a fully streamed body is cached
+        _cache_set(("all",), b"".join(chunks))
+    except Exception as e:
+        logger.error(f"Error streaming campaigns: {e}")
+        raise
     finally:
-        conn.close()
+        cursor.close()
+        _CONN_POOL.put(conn)
+
+
+# Pre-reduced chart series, so clients never download every row to group them
+_AGGREGATE_STMTS = {
+    "by_topic": """
+            SELECT campaign_topic, SUM(audience_size) AS audience_size
+            FROM campaigns
+            GROUP BY campaign_topic
+            ORDER BY audience_size DESC
+        """,
+    "by_segment": """
+            SELECT customer_segment,
+                   AVG(conversion_rate) AS conversion_rate,
+                   AVG(open_rate) AS open_rate,
+                   AVG(click_rate) AS click_rate,
+                   SUM(audience_size) AS audience_size
+            FROM campaigns
+            GROUP BY customer_segment
+        """,
+    "daily_trends": """
+            SELECT campaign_date,
+                   AVG(conversion_rate) AS conversion_rate,
+                   AVG(open_rate) AS open_rate,
+                   AVG(click_rate) AS click_rate
+            FROM campaigns
+            GROUP BY campaign_date
+            ORDER BY campaign_date
+        """,
+}
+
+
+def _get_aggregate(conn: sqlite3.Connection, name: str) -> dict:
+    """Run a named aggregate query, serving repeats from the response cache."""
+    cached = _cache_get(("aggregate", name))
+    if cached is not None:
+        return cached
+    
+    try:
+        rows = [dict(row) for row in conn.execute(_AGGREGATE_STMTS[name]).fetchall()]
+    except Exception as e:
+        logger.error(f"Database error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving campaign aggregates: {str(e)}"
+        )
+    
+    result = {"count": len(rows), "rows": rows}
+    _cache_set(("aggregate", name), result)
+    return result
+
+
+@app.get("/campaigns/by_topic", tags=["analytics"])
+@limiter.limit("60/minute")
+async def get_audience_by_topic(
+    request: Request,
+    api_key_info: APIKeyInfo = Depends(verify_api_key),
+    conn: sqlite3.Connection = Depends(get_database_connection)
+):
+    """
+    Get total audience size per campaign topic, largest first.
+    """
+    logger.info(f"API: Getting audience by topic (API Key: {api_key_info['name']})")
+    return _get_aggregate(conn, "by_topic")
+
+
+@app.get("/campaigns/by_segment", tags=["analytics"])
+@limiter.limit("60/minute")
+async def get_performance_by_segment(
+    request: Request,
+    api_key_info: APIKeyInfo = Depends(verify_api_key),
+    conn: sqlite3.Connection = Depends(get_database_connection)
+):
+    """
+    Get average rates and total audience size per customer segment.
+    """
+    logger.info(f"API: Getting performance by segment (API Key: {api_key_info['name']})")
+    return _get_aggregate(conn, "by_segment")
+
+
+@app.get("/campaigns/daily_trends", tags=["analytics"])
+@limiter.limit("60/minute")
+async def get_daily_trends(
+    request: Request,
+    api_key_info: APIKeyInfo = Depends(verify_api_key),
+    conn: sqlite3.Connection = Depends(get_database_connection)
+):
+    """
+    Get average conversion, open and click rates per campaign date.
+    """
+    logger.info(f"API: Getting daily trends (API Key: {api_key_info['name']})")
+    return _get_aggregate(conn, "daily_trends")
+
+
+@app.post("/admin/cache/flush", tags=["admin"])
+@limiter.limit("10/minute")
+async def flush_response_cache(
+    request: Request,
+    api_key_info: APIKeyInfo = Depends(verify_admin_key)
+):
+    """
+    Drop all cached analytics responses.
+    
+    Call this after new campaign data is loaded so the next requests read it.
+    Requires a key listed in API_ADMIN_KEYS.
+    """
+    with _RESPONSE_CACHE_LOCK:
+        flushed = len(_RESPONSE_CACHE)
+        _RESPONSE_CACHE.clear()
+    logger.info(f"API: Flushed {flushed} cached responses (API Key: {api_key_info['name']})")
+    return {"flushed": flushed}
 
 
 @app.get("/campaigns/{campaign_id}", response_model=CampaignResponse, tags=["campaigns"])
@@ -550,7 +736,8 @@ async def get_all_campaigns(
 async def get_campaign_by_id(
     request: Request,
     campaign_id: int,
-    api_key_info: APIKeyInfo = Depends(verify_api_key)
+    api_key_info: APIKeyInfo = Depends(verify_api_key),
+    conn: sqlite3.Connection = Depends(get_database_connection)
 ):
     """
     Get detailed information about a specific campaign by ID.
@@ -559,7 +746,6 @@ async def get_campaign_by_id(
     """
     logger.info(f"API: Getting campaign details for ID: {campaign_id} (API Key: {api_key_info['name']})")
     
-    conn = get_database_connection()
     try:
         query = """
             SELECT * FROM campaigns 
@@ -568,14 +754,7 @@ async def get_campaign_by_id(
         result = conn.execute(query, (campaign_id,)).fetchone()
         
         if result:
-            # Get column names
-            columns = [
-                description[0] for description in 
-                conn.execute(query, (campaign_id,)).description
-            ]
-            campaign_data = dict(zip(columns, result))
-            
-            return CampaignResponse(**campaign_data)
+            return CampaignResponse(**result)
         else:
             raise HTTPException(
                 status_code=404, 
@@ -590,9 +769,8 @@ async def get_campaign_by_id(
             status_code=500, 
             detail=f"Error retrieving campaign {campaign_id}: {str(e)}"
         )
-    finally:
-        conn.close()
-        
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -1,10 +1,27 @@
 import streamlit as st
 from . import login
-import requests
+from .http_session import get_session
+import orjson
 import json
 from datetime import datetime
 from agents.chatbot import token_tracker
 
+# (connect, read) timeout for Firebase calls, so a stalled request cannot hang the page
+FIREBASE_TIMEOUT = (3.05, 10)
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_user_stats(user_id: str) -> dict:
+    """Token usage totals for a user, cached briefly across reruns."""
+    return token_tracker.get_user_token_stats(user_id)
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_recent_activity(user_id: str, limit: int = 5) -> dict:
+    """Recent token usage rows for a user, cached briefly across reruns."""
+    return token_tracker.get_user_recent_activity(user_id, limit=limit)
+
+
 def delete_firebase_user(id_token: str) -> dict:
     """Delete user account from Firebase."""
     try:
@@ -16,7 +33,7 @@ def delete_firebase_user(id_token: str) -> dict:
             "idToken": id_token
         }
         
-        response = requests.post(url, json=payload)
+        response = get_session().post(url, json=payload, timeout=FIREBASE_TIMEOUT)
         
         if response.status_code == 200:
             return {
@@ -24,7 +41,7 @@ def delete_firebase_user(id_token: str) -> dict:
                 "message": "Account deleted successfully"
             }
         else:
-            error_data = response.json()
+            error_data = orjson.loads(response.content)
             return {
                 "success": False,
                 "error": error_data.get("error", {}).get("message", "Account deletion failed")
@@ -35,6 +52,76 @@ def delete_firebase_user(id_token: str) -> dict:
             "error": str(e)
         }
 
+@st.fragment
+def _delete_confirmation(user_info: dict):
+    """Delete-account confirmation; typing the email reruns only this fragment."""
+    st.markdown("---")
+    st.error("⚠️ **DANGER ZONE - Delete Account**")
+    
+    st.markdown("""
+    **This action will permanently:**
+    - Delete your Firebase account
+    - Remove all your data
+    - Revoke access to this application
+    - Cannot be undone or reversed
+    """)
+    
+    # Confirmation input
+    st.markdown("**Type your email address to confirm deletion:**")
+    confirmation_email = st.text_input(
+        "Email confirmation", 
+        placeholder=f"Type {user_info['email']} to confirm",
+        key="delete_confirmation_email"
+    )
+    
+    col_confirm, col_cancel = st.columns(2)
+    
+    with col_confirm:
+        # Only enable confirm button if email matches
+        email_matches = confirmation_email == user_info['email']
+        confirm_delete = st.button(
+            "🗑️ DELETE ACCOUNT", 
+            use_container_width=True, 
+            type="primary",
+            disabled=not email_matches
+        )
+        
+        if confirm_delete and email_matches:
+            # Get the ID token for deletion
+            id_token = st.session_state.get('id_token')
+            
+            if id_token:
+                with st.spinner("Deleting account from Firebase..."):
+                    result = delete_firebase_user(id_token)
+                
+                if result["success"]:
+                    st.success("✅ Account deleted successfully!")
+                    st.info("Your Firebase account has been permanently deleted.")
+                    st.balloons()
+                    
+                    # Clear session and redirect to login
+                    login.logout()
+                else:
+                    st.error(f"❌ Account deletion failed: {result['error']}")
+                    st.info("Please try again or contact support if the problem persists.")
+            else:
+                st.error("❌ Unable to delete account: No valid authentication token found.")
+                st.info("Please log out and log back in, then try again.")
+    
+    with col_cancel:
+        if st.button("Cancel", use_container_width=True):
+            st.session_state.show_delete_confirmation = False
+            if "delete_confirmation_email" in st.session_state:
+                del st.session_state.delete_confirmation_email
+            st.rerun()
+    
+    # Show email match status
+    if confirmation_email:
+        if email_matches:
+            st.success("✅ Email confirmed - deletion enabled")
+        else:
+            st.warning("⚠️ Email doesn't match - please type your exact email address")
+
 def app():
     """Account management page."""
     st.title("👤 Account Management")
@@ -51,17 +138,16 @@ def app():
     # User Information Section
     st.markdown("### 📋 User Information")
     
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.info(f"**Username:** {user_info['username']}")
-        st.info(f"**Email:** {user_info['email']}")
+    user_fields = {
+        "Username": user_info['username'],
+        "Email": user_info['email'],
+        "Role": user_info['role'].title(),
+    }
+    if user_info['login_time']:
+        user_fields["Last Login"] = user_info['login_time'].strftime("%Y-%m-%d %H:%M:%S")
     
-    with col2:
-        st.info(f"**Role:** {user_info['role'].title()}")
-        if user_info['login_time']:
-            login_time = user_info['login_time'].strftime("%Y-%m-%d %H:%M:%S")
-            st.info(f"**Last Login:** {login_time}")
+    # One block instead of a box per field
+    st.info("  \n".join(f"**{key}:** {value}" for key, value in user_fields.items()))
     
     st.markdown("---")
 
@@ -70,8 +156,11 @@ def app():
     
     user_id = st.session_state.get('user_id')
     if user_id:
+        if st.button("🔄 Refresh stats"):
+            _cached_user_stats.clear()
+            _cached_recent_activity.clear()
         try:
-            user_stats = token_tracker.get_user_token_stats(user_id)
+            user_stats = _cached_user_stats(user_id)
             
             if user_stats.get('total_queries', 0) > 0:
                 col1, col2, col3, col4 = st.columns(4)
@@ -93,7 +182,7 @@ def app():
                 
                 # Show recent activity if available
                 try:
-                    recent_activity = token_tracker.get_user_recent_activity(user_id, limit=5)
+                    recent_activity = _cached_recent_activity(user_id, limit=5)
                     if recent_activity.get('recent_activities'):
                         with st.expander("Recent Activity (Last 5 queries)"):
                             for activity in recent_activity['recent_activities']:
@@ -123,8 +212,7 @@ def app():
         "Two-Factor Authentication": "Not Enabled"
     }
     
-    for key, value in security_info.items():
-        st.info(f"**{key}:** {value}")
+    st.info("  \n".join(f"**{key}:** {value}" for key, value in security_info.items()))
     
     st.markdown("---")
     
@@ -136,72 +224,7 @@ def app():
     
     # Delete Account Confirmation
     if st.session_state.get("show_delete_confirmation", False):
-        st.markdown("---")
-        st.error("⚠️ **DANGER ZONE - Delete Account**")
-        
-        st.markdown("""
-        **This action will permanently:**
-        - Delete your Firebase account
-        - Remove all your data
-        - Revoke access to this application
-        - Cannot be undone or reversed
-        """)
-        
-        # Confirmation input
-        st.markdown("**Type your email address to confirm deletion:**")
-        confirmation_email = st.text_input(
-            "Email confirmation", 
-            placeholder=f"Type {user_info['email']} to confirm",
-            key="delete_confirmation_email"
-        )
-        
-        col_confirm, col_cancel = st.columns(2)
-        
-        with col_confirm:
-            # Only enable confirm button if email matches
-            email_matches = confirmation_email == user_info['email']
-            confirm_delete = st.button(
-                "🗑️ DELETE ACCOUNT", 
-                use_container_width=True, 
-                type="primary",
-                disabled=not email_matches
-            )
-            
-            if confirm_delete and email_matches:
-                # Get the ID token for deletion
-                id_token = st.session_state.get('id_token')
-                
-                if id_token:
-                    with st.spinner("Deleting account from Firebase..."):
-                        result = delete_firebase_user(id_token)
-                    
-                    if result["success"]:
-                        st.success("✅ Account deleted successfully!")
-                        st.info("Your Firebase account has been permanently deleted.")
-                        st.balloons()
-                        
-                        # Clear session and redirect to login
-                        login.logout()
-                    else:
-                        st.error(f"❌ Account deletion failed: {result['error']}")
-                        st.info("Please try again or contact support if the problem persists.")
-                else:
-                    st.error("❌ Unable to delete account: No valid authentication token found.")
-                    st.info("Please log out and log back in, then try again.")
-        
-        with col_cancel:
-            if st.button("Cancel", use_container_width=True):
-                st.session_state.show_delete_confirmation = False
-                if "delete_confirmation_email" in st.session_state:
-                    del st.session_state.delete_confirmation_email
-                st.rerun()
-        
-        # Show email match status
-        if confirmation_email:
-            if email_matches:
-                st.success("✅ Email confirmed - deletion enabled")
-            else:
-                st.warning("⚠️ Email doesn't match - please type your exact email address")
+        _delete_confirmation(user_info)
 
     # Footer
     st.markdown("---")
@@ -1,12 +1,10 @@
 # chart_utils.py
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
-import requests
-import json
+import orjson
 from loguru import logger
-import uuid
+from .http_session import get_session
 import os
 from dotenv import load_dotenv
 
@@ -16,52 +14,37 @@ load_dotenv()
 # API Configuration from environment
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 API_KEY = os.getenv("API_KEY", "sk-test-1234567890abcdef")
+CHART_CACHE_TTL = int(os.getenv("CHART_CACHE_TTL", "300"))  # seconds
+API_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+API_HEADERS = {"Authorization": f"Bearer {API_KEY}"}
 
 
-def get_campaign_data():
-    """Fetch campaign data from the API."""
-    try:
-        headers = {"Authorization": f"Bearer {API_KEY}"}
-        response = requests.get(f"{API_BASE_URL}/campaigns/summary", headers=headers)
-        
-        if response.status_code == 200:
-            # Get all campaigns for detailed analysis
-            campaigns_response = requests.get(
-                f"{API_BASE_URL}/campaigns/all", 
-                headers=headers
-            )
-            
-            if campaigns_response.status_code == 200:
-                campaigns_data = campaigns_response.json()
-                return pd.DataFrame(campaigns_data['campaigns'])
-            else:
-                logger.error(f"Failed to get campaigns: {campaigns_response.status_code}")
-                return None
-        else:
-            logger.error(f"Failed to get summary: {response.status_code}")
-            return None
-            
-    except Exception as e:
-        logger.error(f"Error fetching campaign data: {e}")
-        return None
+@st.cache_data(ttl=CHART_CACHE_TTL, show_spinner=False)
+def get_chart_data(path: str, field: str):
+    """Fetch a pre-aggregated chart series from the API.
+
+    Raises on failure so that errors are never cached; callers handle them.
+    """
+    response = get_session().get(
+        f"{API_BASE_URL}{path}", headers=API_HEADERS, timeout=API_TIMEOUT
+    )
+    response.raise_for_status()
+    df = pd.DataFrame(orjson.loads(response.content)[field])
+    if 'campaign_date' in df:
+        df['campaign_date'] = pd.to_datetime(df['campaign_date'], format='ISO8601')
+    return df
 
 
-def create_audience_by_topic_chart():
+def create_audience_by_topic_chart(df: pd.DataFrame):
     """Create a basic bar chart showing audience volume by campaign topic."""
-    df = get_campaign_data()
-    if df is None or df.empty:
-        st.error("Unable to fetch campaign data for visualization.")
-        return None
-    topic_audience = df.groupby('campaign_topic')['audience_size'].sum().reset_index()
-    topic_audience = topic_audience.sort_values('audience_size', ascending=False)
-    fig = px.bar(
-        topic_audience,
-        x='campaign_topic',
-        y='audience_size',
-        title='Target Audience Volume by Campaign Topic',
-        labels={'campaign_topic': 'Campaign Topic', 'audience_size': 'Audience Size'}
-    )
+    fig = go.Figure(go.Bar(
+        x=df['campaign_topic'].to_numpy(),
+        y=df['audience_size'].to_numpy()
+    ))
     fig.update_layout(
+        title='Target Audience Volume by Campaign Topic',
+        xaxis_title='Campaign Topic',
+        yaxis_title='Audience Size',
         xaxis_tickangle=-45,
         height=500,
         showlegend=False
@@ -69,48 +52,34 @@ def create_audience_by_topic_chart():
     return fig
 
 
-def create_conversion_rate_chart():
+def create_conversion_rate_chart(df: pd.DataFrame):
     """Create a basic bar chart showing conversion rates by campaign."""
-    df = get_campaign_data()
-    if df is None or df.empty:
-        st.error("Unable to fetch campaign data for visualization.")
-        return None
-    df_sorted = df.sort_values('conversion_rate', ascending=False).head(10)
-    fig = px.bar(
-        df_sorted,
-        x='campaign_topic',
-        y='conversion_rate',
-        title='Top 10 Campaigns by Conversion Rate',
-        labels={'campaign_topic': 'Campaign Topic', 'conversion_rate': 'Conversion Rate (%)'}
-    )
+    fig = go.Figure(go.Bar(
+        x=df['campaign_topic'].to_numpy(),
+        y=df['conversion_rate'].to_numpy()
+    ))
     fig.update_layout(
+        title='Top 10 Campaigns by Conversion Rate',
+        xaxis_title='Campaign Topic',
+        yaxis_title='Conversion Rate (%)',
         xaxis_tickangle=-45,
+        barmode='relative',
         height=500,
         showlegend=False
     )
     return fig
 
 
-def create_segment_performance_chart():
+def create_segment_performance_chart(df: pd.DataFrame):
     """Create a basic bar chart showing performance by customer segment."""
-    df = get_campaign_data()
-    if df is None or df.empty:
-        st.error("Unable to fetch campaign data for visualization.")
-        return None
-    segment_performance = df.groupby('customer_segment').agg({
-        'conversion_rate': 'mean',
-        'open_rate': 'mean',
-        'click_rate': 'mean',
-        'audience_size': 'sum'
-    }).reset_index()
-    fig = px.bar(
-        segment_performance,
-        x='customer_segment',
-        y='conversion_rate',
-        title='Average Conversion Rate by Customer Segment',
-        labels={'customer_segment': 'Customer Segment', 'conversion_rate': 'Avg Conversion Rate (%)'}
-    )
+    fig = go.Figure(go.Bar(
+        x=df['customer_segment'].to_numpy(),
+        y=df['conversion_rate'].to_numpy()
+    ))
     fig.update_layout(
+        title='Average Conversion Rate by Customer Segment',
+        xaxis_title='Customer Segment',
+        yaxis_title='Avg Conversion Rate (%)',
         xaxis_tickangle=-45,
         height=500,
         showlegend=False
@@ -118,36 +87,27 @@ def create_segment_performance_chart():
     return fig
 
 
-def create_trend_chart():
+def create_trend_chart(df: pd.DataFrame):
     """Create a basic line chart showing trends over time."""
-    df = get_campaign_data()
-    if df is None or df.empty:
-        st.error("Unable to fetch campaign data for visualization.")
-        return None
-    df['campaign_date'] = pd.to_datetime(df['campaign_date'])
-    daily_trends = df.groupby('campaign_date').agg({
-        'conversion_rate': 'mean',
-        'open_rate': 'mean',
-        'click_rate': 'mean'
-    }).reset_index()
+    dates = df['campaign_date'].to_numpy()
     fig = go.Figure()
     fig.add_trace(go.Scatter(
-        x=daily_trends['campaign_date'],
-        y=daily_trends['conversion_rate'],
+        x=dates,
+        y=df['conversion_rate'].to_numpy(),
         mode='lines+markers',
         name='Conversion Rate',
         line=dict(color='black', width=2)
     ))
     fig.add_trace(go.Scatter(
-        x=daily_trends['campaign_date'],
-        y=daily_trends['open_rate'],
+        x=dates,
+        y=df['open_rate'].to_numpy(),
         mode='lines+markers',
         name='Open Rate',
         line=dict(color='gray', width=2)
     ))
     fig.add_trace(go.Scatter(
-        x=daily_trends['campaign_date'],
-        y=daily_trends['click_rate'],
+        x=dates,
+        y=df['click_rate'].to_numpy(),
         mode='lines+markers',
         name='Click Rate',
         line=dict(color='lightgray', width=2)
@@ -163,26 +123,37 @@ def create_trend_chart():
     return fig
 
 
-def display_chart(chart_type: str):
+# Chart type -> (API path, response field, builder)
+_CHARTS = {
+    "audience_by_topic": ("/campaigns/by_topic", "rows", create_audience_by_topic_chart),
+    "conversion_rate": (
+        "/campaigns/top/conversion_rate?limit=10", "campaigns", create_conversion_rate_chart
+    ),
+    "segment_performance": ("/campaigns/by_segment", "rows", create_segment_performance_chart),
+    "trends": ("/campaigns/daily_trends", "rows", create_trend_chart),
+}
+
+
+@st.fragment
+def display_chart(chart_type: str, key: str = None):
     """Display a specific chart based on the chart type."""
-    unique_key = f"{chart_type}-{uuid.uuid4()}"
-    if chart_type == "audience_by_topic":
-        fig = create_audience_by_topic_chart()
-        if fig:
-            st.plotly_chart(fig, use_container_width=True, key=unique_key)
-    elif chart_type == "conversion_rate":
-        fig = create_conversion_rate_chart()
-        if fig:
-            st.plotly_chart(fig, use_container_width=True, key=unique_key)
-    elif chart_type == "segment_performance":
-        fig = create_segment_performance_chart()
-        if fig:
-            st.plotly_chart(fig, use_container_width=True, key=unique_key)
-    elif chart_type == "trends":
-        fig = create_trend_chart()
-        if fig:
-            st.plotly_chart(fig, use_container_width=True, key=unique_key)
-    # No return value
+    chart = _CHARTS.get(chart_type)
+    if chart is None:
+        return
+    path, field, builder = chart
+    try:
+        df = get_chart_data(path, field)
+    except Exception as e:
+        logger.error(f"Error fetching chart data from {path}: {e}")
+        df = None
+    if df is None or df.empty:
+        st.error("Unable to fetch campaign data for visualization.")
+        return
+    fig = builder(df)
+    if fig:
+        st.plotly_chart(
+            fig, use_container_width=True, key=key or f"chart-{chart_type}", theme=None
+        )
 
 
 def get_available_charts():
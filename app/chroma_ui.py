@@ -1,6 +1,7 @@
 import streamlit as st
 from . import login
 import os
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
 from databases.chroma_config import get_chroma_client
 
@@ -29,6 +30,59 @@ def get_client():
     return get_chroma_client()
 
 
+@st.cache_data(ttl=60, show_spinner=False)
+def list_collections_with_counts():
+    """List (name, document count) for every collection."""
+    collections = get_client().list_collections()
+    if not collections:
+        return []
+    # count() is one round-trip per collection, so issue them concurrently
+    with ThreadPoolExecutor(max_workers=min(8, len(collections))) as executor:
+        counts = list(executor.map(lambda c: c.count(), collections))
+    return [(c.name, count) for c, count in zip(collections, counts)]
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_sample_documents(name: str, limit: int = 5):
+    """Fetch the first documents and metadatas of a collection, without embeddings."""
+    result = get_client().get_collection(name).get(
+        limit=limit, include=["documents", "metadatas"]
+    )
+    return result["documents"], result["metadatas"]
+
+
+@st.fragment
+def render_collection(name: str, count: int):
+    """Render one collection's expander; its widgets rerun only this fragment."""
+    with st.expander(f"📁 Collection: {name}"):
+        try:
+            # Collection Info
+            st.info(f"**Documents Count:** {count}")
+            
+            # Sample Documents, fetched only on request since
+            # expander bodies run even when collapsed
+            show_samples = count > 0 and st.toggle(
+                "Show sample documents", key=f"expanded_{name}"
+            )
+            if show_samples:
+                st.markdown("#### 📄 Sample Documents")
+                # Show first 5 documents
+                docs, metas = get_sample_documents(name, 5)
+                docs_with_idx = enumerate(zip(docs, metas))
+                for idx, (doc, meta) in docs_with_idx:
+                    with st.expander(f"Document {idx + 1}"):
+                        st.write("**Content:**")
+                        st.text(doc[:500] + ("..." if len(doc) > 500 else ""))
+                        st.write("**Metadata:**")
+                        st.json(meta)
+                
+        except Exception as e:
+            st.error(
+                f"Error accessing collection "
+                f"{name}: {str(e)}"
+            )
+
+
 def app():
     """ChromaDB management page."""
     st.title("ChromaDB Explorer")
@@ -43,8 +97,7 @@ def app():
         return
 
     try:
-        client = get_client()
-        collections = client.list_collections()
+        collections = list_collections_with_counts()
 
         # Collections Overview Section
         st.markdown("### 📚 Collections Overview")
@@ -56,6 +109,8 @@ def app():
         
         with col2:
             if st.button("🔄 Refresh", use_container_width=True):
+                list_collections_with_counts.clear()
+                get_sample_documents.clear()
                 st.rerun()
 
         # Collections List Section
@@ -63,37 +118,8 @@ def app():
         if not collections:
             st.info("No collections found in the database")
         else:
-            for collection in collections:
-                with st.expander(f"📁 Collection: {collection.name}"):
-                    try:
-                        # Collection Info
-                        count = collection.count()
-                        st.info(f"**Documents Count:** {count}")
-                        
-                        # Sample Documents
-                        if count > 0:
-                            st.markdown("#### 📄 Sample Documents")
-                            # Show first 5 documents
-                            result = collection.peek(5)
-                            if 'documents' in result:
-                                docs = result['documents']
-                                metas = result['metadatas']
-                                docs_with_idx = enumerate(zip(docs, metas))
-                                for idx, (doc, meta) in docs_with_idx:
-                                    with st.expander(f"Document {idx + 1}"):
-                                        st.write("**Content:**")
-                                        doc_preview = doc[:500]
-                                        if len(doc) > 500:
-                                            doc_preview += "..."
-                                        st.text(doc_preview)
-                                        st.write("**Metadata:**")
-                                        st.json(meta)
-                            
-                    except Exception as e:
-                        st.error(
-                            f"Error accessing collection "
-                            f"{collection.name}: {str(e)}"
-                        )
+            for name, count in collections:
+                render_collection(name, count)
 
     except Exception as e:
         st.error(f"❌ Error connecting to ChromaDB: {str(e)}")
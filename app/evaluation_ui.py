@@ -1,6 +1,7 @@
 """Streamlit UI for RAG Evaluation Results."""
 import os
 import sys
+from typing import List, Tuple
 import pandas as pd
 import streamlit as st
 from . import login
@@ -25,87 +26,196 @@ logger.add(
     level="INFO"
 )
 
+# Score columns of qa_evaluation_results; FLOAT in MySQL, so float32 loses nothing
+SCORE_COLUMNS = (
+    'faithfulness_score', 'factual_correctness_score', 'answer_similarity_score',
+    'context_precision_score', 'context_recall_score', 'answer_accuracy_score',
+    'overall_score'
+)
 
-def add_test_question(question: str, expected_response: str) -> bool:
-    """Add a new test question to the database."""
+
+def _read_frame(query: str, params: tuple = ()) -> pd.DataFrame:
+    """Run a query on a pooled connection and build a DataFrame from the fetched rows."""
+    with get_mysql_client() as conn, conn.cursor() as cursor:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        columns = [column[0] for column in cursor.description]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def add_test_questions(rows: List[Tuple[str, str]]) -> bool:
+    """Add (question, expected_response) rows in one batch and one commit."""
     try:
-        conn = get_mysql_client()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO qa_tests (question, expected_response) VALUES (%s, %s)",
-            (question, expected_response)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_mysql_client() as conn, conn.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO qa_tests (question, expected_response) VALUES (%s, %s)",
+                rows
+            )
+            conn.commit()
+        _fetch_test_questions.clear()
         return True
     except Exception as e:
-        logger.error(f"Error adding test question: {e}")
+        logger.error(f"Error adding test questions: {e}")
         return False
 
 
-def update_test_question(id: int, question: str, expected_response: str) -> bool:
-    """Update an existing test question."""
+def upsert_test_questions(rows: List[Tuple[int, str, str]]) -> bool:
+    """Insert or update (id, question, expected_response) rows in one batch and one commit."""
     try:
-        conn = get_mysql_client()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE qa_tests SET question = %s, expected_response = %s WHERE id = %s",
-            (question, expected_response, id)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_mysql_client() as conn, conn.cursor() as cursor:
+            cursor.executemany(
+                """
+                INSERT INTO qa_tests (id, question, expected_response) VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    question = VALUES(question),
+                    expected_response = VALUES(expected_response)
+                """,
+                rows
+            )
+            conn.commit()
+        _fetch_test_questions.clear()
         return True
     except Exception as e:
-        logger.error(f"Error updating test question: {e}")
+        logger.error(f"Error saving test questions: {e}")
         return False
 
+
+def add_test_question(question: str, expected_response: str) -> bool:
+    """Add a new test question to the database."""
+    return add_test_questions([(question, expected_response)])
+
+
+def update_test_question(id: int, question: str, expected_response: str) -> bool:
+    """Update an existing test question."""
+    return upsert_test_questions([(id, question, expected_response)])
+
 def delete_test_question(id: int) -> bool:
     """Delete a test question."""
     try:
-        conn = get_mysql_client()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM qa_tests WHERE id = %s", (id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_mysql_client() as conn, conn.cursor() as cursor:
+            cursor.execute("DELETE FROM qa_tests WHERE id = %s", (id,))
+            conn.commit()
+        _fetch_test_questions.clear()
         return True
     except Exception as e:
         logger.error(f"Error deleting test question: {e}")
         return False
 
 
+@st.cache_data(ttl=30, max_entries=8, show_spinner=False)
+def _fetch_test_questions():
+    """Query test questions; errors propagate so they are never cached."""
+    return _read_frame("SELECT * FROM qa_tests")
+
+
 def get_test_questions():
     """Load test questions from MySQL database."""
     try:
-        conn = get_mysql_client()
-        query = "SELECT * FROM qa_tests"
-        df = pd.read_sql(query, conn)
-        conn.close()
-        return df
+        return _fetch_test_questions()
     except Exception as e:
         logger.error(f"Error loading test questions: {e}")
         return pd.DataFrame()
 
 
-def get_evaluation_results():
-    """Load evaluation results from MySQL database."""
+@st.cache_data(ttl=60, max_entries=8, show_spinner=False)
+def _fetch_recent_runs(limit: int):
+    """Query the most recent run IDs; errors propagate so they are never cached."""
+    query = """
+    SELECT run_id, MAX(created_at) AS created_at
+    FROM qa_evaluation_results
+    GROUP BY run_id
+    ORDER BY created_at DESC
+    LIMIT %s
+    """
+    return _read_frame(query, (limit,))
+
+
+def list_recent_runs(limit: int = 20):
+    """Load the most recent evaluation run IDs, newest first."""
     try:
-        conn = get_mysql_client()
-        query = """
-        SELECT * FROM qa_evaluation_results 
-        ORDER BY created_at DESC
-        LIMIT 20
-        """
-        df = pd.read_sql(query, conn)
-        conn.close()
-        return df
+        return _fetch_recent_runs(limit)
+    except Exception as e:
+        logger.error(f"Error loading evaluation runs: {e}")
+        return pd.DataFrame()
+
+
+@st.cache_data(ttl=60, max_entries=8, show_spinner=False)
+def _fetch_run_rows(run_id: str):
+    """Query the rows of one run; errors propagate so they are never cached."""
+    query = """
+    SELECT id, question, {scores}, pass_fail
+    FROM qa_evaluation_results
+    WHERE run_id = %s
+    ORDER BY id
+    """
+    df = _read_frame(query.format(scores=", ".join(SCORE_COLUMNS)), (run_id,))
+    return df.astype({column: 'float32' for column in SCORE_COLUMNS})
+
+
+def get_run_rows(run_id: str):
+    """Load the question, scores and status of every result in a single run."""
+    try:
+        return _fetch_run_rows(run_id)
     except Exception as e:
         logger.error(f"Error loading evaluation results: {e}")
         return pd.DataFrame()
 
 
+@st.cache_data(ttl=60, max_entries=64, show_spinner=False)
+def _fetch_row_detail(row_id: int) -> dict:
+    """Query the detail of one result; errors propagate so they are never cached."""
+    query = """
+    SELECT expected_response, actual_response, context
+    FROM qa_evaluation_results
+    WHERE id = %s
+    """
+    with get_mysql_client() as conn, conn.cursor(dictionary=True) as cursor:
+        cursor.execute(query, (row_id,))
+        return cursor.fetchone() or {}
+
+
+def get_row_detail(row_id: int) -> dict:
+    """Load the expected and actual responses and context of one result."""
+    try:
+        return _fetch_row_detail(row_id)
+    except Exception as e:
+        logger.error(f"Error loading evaluation result {row_id}: {e}")
+        return {}
+
+
+@st.cache_data(ttl=60, max_entries=8, show_spinner=False)
+def _fetch_run_summary(run_id: str) -> dict:
+    """Query the score averages of one run; errors propagate so they are never cached."""
+    averages = ",\n           ".join(
+        f"AVG({column}) AS {column}" for column in SCORE_COLUMNS
+    )
+    query = f"""
+    SELECT MAX(created_at) AS created_at,
+           {averages},
+           AVG(pass_fail) AS pass_rate
+    FROM qa_evaluation_results
+    WHERE run_id = %s
+    """
+    with get_mysql_client() as conn, conn.cursor(dictionary=True) as cursor:
+        cursor.execute(query, (run_id,))
+        row = cursor.fetchone()
+    if not row or row['created_at'] is None:
+        return {}
+    created_at = row.pop('created_at')
+    summary = {key: float(value or 0) for key, value in row.items()}
+    summary['created_at'] = created_at
+    return summary
+
+
+def get_run_summary(run_id: str) -> dict:
+    """Average every score of a single run in one query."""
+    try:
+        return _fetch_run_summary(run_id)
+    except Exception as e:
+        logger.error(f"Error loading evaluation summary: {e}")
+        return {}
+
+
 def app():
     """Evaluation results management page."""
     st.title("RAG Evaluation")
@@ -127,6 +237,9 @@ def app():
         if st.button("🧪 Run Tests", use_container_width=True):
             with st.spinner('Running tests...'):
                 if run_evaluation():
+                    _fetch_recent_runs.clear()
+                    _fetch_run_rows.clear()
+                    _fetch_run_summary.clear()
                     st.success("✅ Evaluation completed successfully!")
                     st.rerun()
                 else:
@@ -163,34 +276,49 @@ def app():
     # Display test questions with edit/delete options
     if not test_questions.empty:
         st.markdown("### 📋 Test Questions")
-        for _, row in test_questions.iterrows():
-            question_preview = (row['question'][:100] + '...') if len(row['question']) > 100 else row['question']
+        # Collect every question whose text areas differ from the stored values
+        pending_edits = [
+            (row.id, st.session_state[f"q_{row.id}"], st.session_state[f"r_{row.id}"])
+            for row in test_questions.itertuples(index=False)
+            if f"q_{row.id}" in st.session_state
+            and (st.session_state[f"q_{row.id}"], st.session_state[f"r_{row.id}"])
+            != (row.question, row.expected_response)
+        ]
+        if pending_edits:
+            if st.button(f"💾 Save all edits ({len(pending_edits)})", use_container_width=True):
+                if upsert_test_questions(pending_edits):
+                    st.success("All edits saved!")
+                    st.rerun()
+                else:
+                    st.error("Saving edits failed")
+        for row in test_questions.itertuples(index=False):
+            question_preview = (row.question[:100] + '...') if len(row.question) > 100 else row.question
             with st.expander(f"❓ {question_preview}"):
                 st.text_area(
                     "Question",
-                    value=row['question'],
-                    key=f"q_{row['id']}",
+                    value=row.question,
+                    key=f"q_{row.id}",
                     height=100
                 )
                 st.text_area(
                     "Expected Response",
-                    value=row['expected_response'],
-                    key=f"r_{row['id']}",
+                    value=row.expected_response,
+                    key=f"r_{row.id}",
                     height=150
                 )
                 col1, col2, _ = st.columns([1, 1, 2])
                 with col1:
-                    if st.button("Update", key=f"update_{row['id']}", use_container_width=True):
-                        updated_q = st.session_state[f"q_{row['id']}"]
-                        updated_r = st.session_state[f"r_{row['id']}"]
-                        if update_test_question(row['id'], updated_q, updated_r):
+                    if st.button("Update", key=f"update_{row.id}", use_container_width=True):
+                        updated_q = st.session_state[f"q_{row.id}"]
+                        updated_r = st.session_state[f"r_{row.id}"]
+                        if update_test_question(row.id, updated_q, updated_r):
                             st.success("Updated successfully!")
                             st.rerun()
                         else:
                             st.error("Update failed")
                 with col2:
-                    if st.button("Delete", key=f"delete_{row['id']}", use_container_width=True):
-                        if delete_test_question(row['id']):
+                    if st.button("Delete", key=f"delete_{row.id}", use_container_width=True):
+                        if delete_test_question(row.id):
                             st.success("Deleted successfully!")
                             st.rerun()
                         else:
@@ -200,19 +328,22 @@ def app():
 
     # Section 2: Evaluation Results
     st.markdown("### 📊 Test Results")
-    results_df = get_evaluation_results()
+    runs_df = list_recent_runs()
     
-    if not results_df.empty:
-        runs = results_df['run_id'].unique()
+    if not runs_df.empty:
         selected_run = st.selectbox(
             "Select Evaluation Run ID", 
-            runs,
+            runs_df['run_id'],
             key="run_selector"
         )
         
-        # Get data for selected run
-        run_data = results_df[results_df['run_id'] == selected_run]
-        run_date = pd.to_datetime(run_data['created_at'].iloc[0]).strftime(
+        # Get summary and rows for selected run
+        summary = get_run_summary(selected_run)
+        run_data = get_run_rows(selected_run)
+        if not summary or run_data.empty:
+            st.warning("Unable to load results for this run.")
+            return
+        run_date = pd.to_datetime(summary['created_at']).strftime(
             '%Y-%m-%d %H:%M:%S'
         )
         st.info(f"**Run Date:** {run_date}")
@@ -222,31 +353,31 @@ def app():
         with metric_cols[0]:
             st.metric(
                 "📈 Faithfulness", 
-                f"{run_data['faithfulness_score'].mean():.2f}",
+                f"{summary['faithfulness_score']:.2f}",
                 help="Measures how factually consistent the answer is with the given context"
             )
             st.metric(
                 "🎯 Context Precision", 
-                f"{run_data['context_precision_score'].mean():.2f}",
+                f"{summary['context_precision_score']:.2f}",
                 help="Measures how relevant the retrieved context is to the question"
             )
             st.metric(
                 "🎭 Overall Score", 
-                f"{run_data['overall_score'].mean():.2f}",
+                f"{summary['overall_score']:.2f}",
                 help="Combined score across all evaluation metrics"
             )
         with metric_cols[1]:
             st.metric(
                 "🔄 Answer Similarity", 
-                f"{run_data['answer_similarity_score'].mean():.2f}",
+                f"{summary['answer_similarity_score']:.2f}",
                 help="Measures how similar the generated answer is to the expected response"
             )
             st.metric(
                 "📡 Context Recall", 
-                f"{run_data['context_recall_score'].mean():.2f}",
+                f"{summary['context_recall_score']:.2f}",
                 help="Measures how well the context covers all aspects needed for the answer"
             )
-            pass_rate = (run_data['pass_fail'].mean() * 100)
+            pass_rate = summary['pass_rate'] * 100
             st.metric(
                 "✨ Pass Rate", 
                 f"{pass_rate:.1f}%",
@@ -255,62 +386,71 @@ def app():
         with metric_cols[2]:
             st.metric(
                 "✅ Factual Correctness", 
-                f"{run_data['factual_correctness_score'].mean():.2f}",
+                f"{summary['factual_correctness_score']:.2f}",
                 help="Measures the factual accuracy of the generated answer"
             )
             st.metric(
                 "🎪 Answer Accuracy", 
-                f"{run_data['answer_accuracy_score'].mean():.2f}",
+                f"{summary['answer_accuracy_score']:.2f}",
                 help="Overall measure of answer accuracy"
             )
         
         # Detailed results section
         st.markdown("### 📋 Detailed Results")
-        for idx, row in run_data.iterrows():
-            question_preview = (row['question'][:100] + '...') if len(row['question']) > 100 else row['question']
-            with st.expander(f"❓ {question_preview}"):
+        for row in run_data.itertuples(index=False):
+            question_preview = (row.question[:100] + '...') if len(row.question) > 100 else row.question
+            status_icon = "✅" if row.pass_fail == 1 else "❌"
+            with st.expander(f"{status_icon} {question_preview}"):
+                # Responses and context are fetched only once the detail is opened
+                if not st.toggle("Show detail", key=f"open_{row.id}"):
+                    continue
+                detail = get_row_detail(int(row.id))
+                if not detail:
+                    st.error("Unable to load this result.")
+                    continue
+
                 # Question
                 st.markdown("**❓ Question:**")
                 st.text_area(
                     "Question",
-                    value=row['question'],
+                    value=row.question,
                     height=100,
                     disabled=True,
                     label_visibility="collapsed",
-                    key=f"question_{idx}"
+                    key=f"question_{row.id}"
                 )
                 
                 # Expected Response
                 st.markdown("**🎯 Expected Response:**")
                 st.text_area(
                     "Expected Response",
-                    value=row['expected_response'],
+                    value=detail['expected_response'],
                     height=150,
                     disabled=True,
                     label_visibility="collapsed",
-                    key=f"expected_{idx}"
+                    key=f"expected_{row.id}"
                 )
                 
                 # Actual Response
                 st.markdown("**🤖 Actual Response:**")
                 st.text_area(
                     "Actual Response",
-                    value=row['actual_response'],
+                    value=detail['actual_response'],
                     height=150,
                     disabled=True,
                     label_visibility="collapsed",
-                    key=f"actual_{idx}"
+                    key=f"actual_{row.id}"
                 )
                 
                 # Context Used
                 st.markdown("**📚 Context Used:**")
                 st.text_area(
                     "Context",
-                    value=row['context'],
+                    value=detail['context'],
                     height=100,
                     disabled=True,
                     label_visibility="collapsed",
-                    key=f"context_{idx}"
+                    key=f"context_{row.id}"
                 )
                 
                 # Individual metrics
@@ -319,42 +459,42 @@ def app():
                 with metric_cols[0]:
                     st.metric(
                         "📈 Faithfulness", 
-                        f"{row['faithfulness_score']:.2f}",
+                        f"{row.faithfulness_score:.2f}",
                         help="Measures how factually consistent the answer is with the given context"
                     )
                     st.metric(
                         "🎯 Context Precision", 
-                        f"{row['context_precision_score']:.2f}",
+                        f"{row.context_precision_score:.2f}",
                         help="Measures how relevant the retrieved context is to the question"
                     )
                     st.metric(
                         "🎭 Overall Score", 
-                        f"{row['overall_score']:.2f}",
+                        f"{row.overall_score:.2f}",
                         help="Combined score across all evaluation metrics"
                     )
                 with metric_cols[1]:
                     st.metric(
                         "🔄 Answer Similarity", 
-                        f"{row['answer_similarity_score']:.2f}",
+                        f"{row.answer_similarity_score:.2f}",
                         help="Measures how similar the generated answer is to the expected response"
                     )
                     st.metric(
                         "📡 Context Recall", 
-                        f"{row['context_recall_score']:.2f}",
+                        f"{row.context_recall_score:.2f}",
                         help="Measures how well the context covers all aspects needed for the answer"
                     )
-                    pass_status = "PASS" if row['pass_fail'] == 1 else "FAIL"
-                    status_color = "green" if row['pass_fail'] == 1 else "red"
+                    pass_status = "PASS" if row.pass_fail == 1 else "FAIL"
+                    status_color = "green" if row.pass_fail == 1 else "red"
                     st.markdown(f"**✨ Status:** :{status_color}[{pass_status}]")
                 with metric_cols[2]:
                     st.metric(
                         "✅ Factual Correctness", 
-                        f"{row['factual_correctness_score']:.2f}",
+                        f"{row.factual_correctness_score:.2f}",
                         help="Measures the factual accuracy of the generated answer"
                     )
                     st.metric(
                         "🎪 Answer Accuracy", 
-                        f"{row['answer_accuracy_score']:.2f}",
+                        f"{row.answer_accuracy_score:.2f}",
                         help="Overall measure of answer accuracy"
                     )
     
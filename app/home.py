@@ -5,12 +5,15 @@ from agents.chatbot import chat_query, clear_memory, get_memory_stats, token_tra
 from .chart_utils import display_chart
 import pandas as pd
 from . import login
-import json
+import orjson
 import os
 
 # Environment variables
 WEB_PUBLIC_URL = os.getenv("WEB_PUBLIC_URL", "http://localhost:8080")
 
+# Number of persisted chat messages loaded into a new session
+CHAT_HISTORY_LIMIT = 100
+
 # Sample questions and help message (should match chatbot.py)
 SAMPLE_QUESTIONS = [
     "Show executive summary for campaign 101",
@@ -48,7 +51,11 @@ def load_chat_history():
     
     if user_id and thread_id:
         try:
-            history = token_tracker.get_chat_history(user_id, thread_id, limit=100)
+            history = token_tracker.iter_chat_history(
+                user_id, thread_id,
+                limit=CHAT_HISTORY_LIMIT,
+                decode_tables=False
+            )
             
             # Process each message to ensure proper structure
             processed_history = []
@@ -61,22 +68,12 @@ def load_chat_history():
                 # Add response type if present
                 # Add optional fields if present
                 optional_fields = [
-                    "response_type", "chart_type", "image_url", "source"
+                    "response_type", "chart_type", "image_url", "source", "table_data"
                 ]
                 for field in optional_fields:
                     if field in message:
                         processed_message[field] = message[field]
                 
-                # Parse table data if present
-                if message.get("table_data"):
-                    try:
-                        table_data = message["table_data"]
-                        if isinstance(table_data, str):
-                            table_data = json.loads(table_data)
-                        processed_message["table_data"] = table_data
-                    except json.JSONDecodeError:
-                        st.warning("Could not parse table data for message")
-                
                 processed_history.append(processed_message)
             
             return processed_history
@@ -102,7 +99,7 @@ def save_chat_message(
     if user_id and thread_id:
         try:
             # Convert table_data to JSON string if provided
-            table_data_json = json.dumps(table_data) if table_data else None
+            table_data_json = orjson.dumps(table_data).decode() if table_data else None
             
             token_tracker.save_chat_message(
                 user_id=user_id,
@@ -160,17 +157,26 @@ def app():
                 st.success(f"Loaded messages from your chat history")
 
     # Display chat history (show text, charts, tables, and examples)
-    for message in st.session_state.messages:
+    for index, message in enumerate(st.session_state.messages):
         avatar = "👤" if message["role"] == "user" else "✨"
         with st.chat_message(message["role"], avatar=avatar):
             st.markdown(message["content"])
             if message.get("chart_type"):
-                display_chart(message["chart_type"])
-            if message.get("table_data"):
-                table = message["table_data"]
-                st.dataframe(
-                    pd.DataFrame(table["rows"], columns=table["columns"])
-                )
+                display_chart(message["chart_type"], key=f"chart-{index}")
+            table = message.get("table_data")
+            if isinstance(table, str):
+                # Tables loaded from history are decoded once, on first render
+                try:
+                    table = orjson.loads(table)
+                except orjson.JSONDecodeError:
+                    table = None
+                    st.warning("Could not parse table data for message")
+                message["table_data"] = table
+            if table:
+                # Built once per message and kept on it for later reruns
+                if "table_df" not in message:
+                    message["table_df"] = pd.DataFrame(table["rows"], columns=table["columns"])
+                st.dataframe(message["table_df"])
             if message.get("examples"):
                 st.markdown("\n".join([f"- {q}" for q in message["examples"]]))
             # Handle image responses
@@ -207,7 +213,10 @@ def app():
             if isinstance(response, dict) and response.get("type") == "chart":
                 st.markdown(response.get("message", ""))
                 data = response.get("data", {})
-                display_chart(data.get("chart_type"))
+                display_chart(
+                    data.get("chart_type"),
+                    key=f"chart-{len(st.session_state.messages)}"
+                )
                 source = data.get("source", "")
                 if source and source.strip():
                     st.caption(f"📚 Source: {source}")
@@ -232,9 +241,8 @@ def app():
             elif isinstance(response, dict) and response.get("type") == "table":
                 st.markdown(response.get("message", ""))
                 data = response.get("data", {})
-                st.dataframe(
-                    pd.DataFrame(data.get("rows",[]), columns=data.get("columns",[]))
-                )
+                table_df = pd.DataFrame(data.get("rows", []), columns=data.get("columns", []))
+                st.dataframe(table_df)
                 source = data.get("source", "")
                 if source and source.strip():
                     st.caption(f"📚 Source: {source}")
@@ -248,6 +256,7 @@ def app():
                     "role": "assistant",
                     "content": response.get("message", ""),
                     "table_data": table_data,
+                    "table_df": table_df,
                     "source": source if source and source.strip() else ""
                 }
                 st.session_state.messages.append(assistant_message)
@@ -0,0 +1,24 @@
+# http_session.py
+"""
+Shared HTTP session for the Streamlit app.
+One pooled requests.Session per server process, reused by every page and user.
+"""
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Return the process-wide session, retrying idempotent requests on gateway errors."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=16,
+        max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
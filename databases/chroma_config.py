@@ -1,5 +1,7 @@
 """ChromaDB configuration module."""
 import os
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional
 from loguru import logger
 import chromadb
 from dotenv import load_dotenv
@@ -11,6 +13,26 @@ load_dotenv()
 CHROMA_HOST = os.getenv("CHROMA_SERVER_HOST", "localhost")
 CHROMA_PORT = os.getenv("CHROMA_SERVER_HTTP_PORT", "8030")
 
+# HNSW index parameters, applied only when a collection is first created; an
+# existing collection keeps its space until it is deleted and re-ingested. With
+# normalized embeddings (EMBED_NORMALIZE) l2 and cosine rank results the same.
+# Query cost grows roughly logarithmically with collection size; raise search_ef for recall.
+HNSW_METADATA = {
+    "hnsw:space": os.getenv("CHROMA_HNSW_SPACE", "cosine"),
+    "hnsw:M": int(os.getenv("CHROMA_HNSW_M", "32")),
+    "hnsw:construction_ef": int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", "200")),
+    "hnsw:search_ef": int(os.getenv("CHROMA_HNSW_SEARCH_EF", "64")),
+}
+
+# Metadata for the campaign_reports collection, shared by ingestion and search
+CAMPAIGN_COLLECTION_METADATA = {
+    "description": "Campaign performance reports and documentation",
+    **HNSW_METADATA
+}
+
+# Records per collection.add() call, kept within ChromaDB's recommended 50-250
+CHROMA_BATCH_SIZE = min(max(int(os.getenv("CHROMA_BATCH_SIZE", "128")), 50), 250)
+
 
 def get_chroma_client():
     """Get a configured ChromaDB client for the containerized instance."""
@@ -37,11 +59,35 @@ def get_or_create_collection(client, name="campaign_reports"):
     try:
         collection = client.get_or_create_collection(
             name=name,
-            metadata={"hnsw:space": "cosine"}
+            metadata=HNSW_METADATA
         )
         logger.info(f"Successfully got/created collection: {name}")
         return collection
         
     except Exception as e:
         logger.error(f"Failed to get/create collection {name}: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+def add_documents_batched(
+    collection,
+    documents: Iterable[str],
+    ids: Iterable[str],
+    metadatas: Optional[Iterable[Dict[str, Any]]] = None,
+    batch_size: int = CHROMA_BATCH_SIZE
+) -> int:
+    """Add documents to a collection in batches; returns the number of records added."""
+    documents, ids = iter(documents), iter(ids)
+    metadatas = iter(metadatas) if metadatas is not None else None
+    added = 0
+    while True:
+        doc_batch: List[str] = list(islice(documents, batch_size))
+        if not doc_batch:
+            return added
+        id_batch = list(islice(ids, len(doc_batch)))
+        meta_batch = (
+            list(islice(metadatas, len(doc_batch))) if metadatas is not None else None
+        )
+        collection.add(documents=doc_batch, ids=id_batch, metadatas=meta_batch)
+        added += len(doc_batch)
+        logger.debug(f"Added batch of {len(doc_batch)} documents to ChromaDB")
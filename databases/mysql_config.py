@@ -1,7 +1,8 @@
 """MySQL configuration module."""
 import os
+import threading
 from loguru import logger
-import mysql.connector
+from mysql.connector import pooling
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -13,24 +14,37 @@ MYSQL_PORT = os.getenv("MYSQL_PORT", "3306")
 MYSQL_USER = os.getenv("MYSQL_USER", "appuser")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "apppassword")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "appdb")
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "8"))
+
+# Created on first use and shared by every caller in the process
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> pooling.MySQLConnectionPool:
+    """Create the process-wide connection pool on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                logger.info(f"Connecting to MySQL at {MYSQL_HOST}:{MYSQL_PORT}")
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name="rag",
+                    pool_size=MYSQL_POOL_SIZE,
+                    host=MYSQL_HOST,
+                    port=MYSQL_PORT,
+                    user=MYSQL_USER,
+                    password=MYSQL_PASSWORD,
+                    database=MYSQL_DATABASE
+                )
+                logger.info("Successfully connected to MySQL")
+    return _pool
 
 
 def get_mysql_client():
-    """Get a configured MySQL client for the containerized instance."""
-    logger.info(f"Connecting to MySQL at {MYSQL_HOST}:{MYSQL_PORT}")
-    
+    """Get a pooled MySQL connection; close() returns it to the pool."""
     try:
-        # Initialize connection to MySQL
-        connection = mysql.connector.connect(
-            host=MYSQL_HOST,
-            port=MYSQL_PORT,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DATABASE
-        )
-        
-        logger.info("Successfully connected to MySQL")
-        return connection
+        return _get_pool().get_connection()
         
     except Exception as e:
         logger.error(f"Failed to connect to MySQL: {e}")
@@ -15,6 +15,12 @@ SQLITE_DIR = DATABASES_DIR / "sqlite"
 DATA_DIR = Path(__file__).parent.parent / "data"
 CSV_DIR = DATA_DIR / "csv"
 
+# Columns the API orders campaigns by
+CAMPAIGN_SORT_COLUMNS = (
+    "conversion_rate", "open_rate", "click_rate",
+    "opens", "clicks", "conversions", "campaign_date"
+)
+
 # Ensure directories exist
 SQLITE_DIR.mkdir(exist_ok=True)
 CSV_DIR.mkdir(parents=True, exist_ok=True)
@@ -66,6 +72,12 @@ class SQLiteConfig:
         df.to_sql('campaigns', conn, if_exists='replace', index=False)
         
         # Create indexes for better performance
+        cls.ensure_campaign_indexes(conn)
+        conn.close()
+
+    @classmethod
+    def ensure_campaign_indexes(cls, conn: sqlite3.Connection):
+        """Create the campaigns lookup and sort indexes, then refresh planner statistics."""
         conn.execute("""
             CREATE INDEX IF NOT EXISTS idx_campaign_id
             ON campaigns(campaign_id)
@@ -78,7 +90,23 @@ class SQLiteConfig:
             CREATE INDEX IF NOT EXISTS idx_customer_segment
             ON campaigns(customer_segment)
         """)
-        conn.close()
+        # LIKE is case-insensitive, so only NOCASE indexes serve prefix matches
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_campaign_topic_nocase
+            ON campaigns(campaign_topic COLLATE NOCASE)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_customer_segment_nocase
+            ON campaigns(customer_segment COLLATE NOCASE)
+        """)
+        # Top-N and listing endpoints walk these in order instead of sorting
+        for column in CAMPAIGN_SORT_COLUMNS:
+            conn.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_campaigns_{column}
+                ON campaigns({column} DESC)
+            """)
+        conn.execute("ANALYZE campaigns")
+        conn.commit()
         
     @classmethod
     def setup_conversations_db(cls):
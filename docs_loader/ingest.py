@@ -22,7 +22,11 @@ from langchain_community.document_loaders import (  # noqa: E402
     UnstructuredWordDocumentLoader
 )
 from langchain_huggingface import HuggingFaceEmbeddings  # noqa: E402
-from databases.chroma_config import get_chroma_client  # noqa: E402
+from databases.chroma_config import (  # noqa: E402
+    CAMPAIGN_COLLECTION_METADATA,
+    add_documents_batched,
+    get_chroma_client
+)
 
 # -------------------------
 # LF changes -->
@@ -37,8 +41,14 @@ class LangChainEmbeddingAdapter(EmbeddingFunction[Documents]):
     def __call__(self, input: Documents):
         return self.ef.embed_documents(input)
 
+# Normalize like agents/llm_tools so stored and query vectors match
+EMBED_NORMALIZE = os.getenv("EMBED_NORMALIZE", "true").lower() == "true"
+
 # Create HuggingFace embeddings object
-hf_embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+hf_embeddings = HuggingFaceEmbeddings(
+    model_name="sentence-transformers/all-MiniLM-L6-v2",
+    encode_kwargs={"normalize_embeddings": EMBED_NORMALIZE}
+)
 
 # Wrap in Chroma adapter
 adapted_embeddings = LangChainEmbeddingAdapter(hf_embeddings)
@@ -196,11 +206,7 @@ class DocumentHandler(FileSystemEventHandler):
             collection = client.get_or_create_collection(
                 name="campaign_reports",
                 embedding_function=adapted_embeddings,
-                metadata={
-                    "description": (
-                        "Campaign performance reports and documentation"
-                    )
-                }
+                metadata=CAMPAIGN_COLLECTION_METADATA
             )
 
             
@@ -217,34 +223,39 @@ class DocumentHandler(FileSystemEventHandler):
             pattern = r"(" + "|".join(map(re.escape, headers)) + ")"
             parts = re.split(pattern, full_text)
             
-            # Process each section
+            # Collect every chunk, then add them to ChromaDB in batches
+            documents, ids, metadatas = [], [], []
+            header_counts = {}
             for i in range(1, len(parts), 2):
                 header = parts[i].strip()
                 content = parts[i+1].strip() if i+1 < len(parts) else ""
                 
+                # A repeated header gets its occurrence in the id, since one
+                # collection.add rejects duplicate ids
+                occurrence = header_counts.get(header, 0)
+                header_counts[header] = occurrence + 1
+                section_id = header.lower().replace(' ', '_')
+                if occurrence:
+                    section_id = f"{section_id}_{occurrence}"
+                
                 # Split section into smaller chunks
                 subchunks = chunk_text(content)
                 for j, chunk in enumerate(subchunks):
                     doc_id = (
                         f"{campaign_id}_"
-                        f"{header.lower().replace(' ', '_')}_"
+                        f"{section_id}_"
                         f"{j}"
                     )
-                    
-                    # Add to ChromaDB with metadata
-                    collection.add(
-                        documents=[f"{header}\n{chunk}"],
-                        ids=[doc_id],
-                        metadatas=[{
-                            **metadata,
-                            "section": header,
-                            "part": j
-                        }]
-                    )
-                    logger.debug(
-                        f"Added chunk {j} of section '{header}' "
-                        f"with ID: {doc_id}"
-                    )
+                    documents.append(f"{header}\n{chunk}")
+                    ids.append(doc_id)
+                    metadatas.append({
+                        **metadata,
+                        "section": header,
+                        "part": j
+                    })
+
+            added = add_documents_batched(collection, documents, ids, metadatas)
+            logger.debug(f"Added {added} chunks from {filename}")
             
             # Move file to done folder
             done_path = os.path.join(DONE_FOLDER, filename)
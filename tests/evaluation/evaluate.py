@@ -1,4 +1,6 @@
 """Main RAG evaluation logic."""
+import asyncio
+import uuid
 import pandas as pd
 import os
 from typing import Dict, Optional, List, Tuple
@@ -14,7 +16,7 @@ from ragas.metrics import (
 )
 from datasets import Dataset
 from dotenv import load_dotenv
-from agents.chatbot import chat_query
+from agents.chatbot import chat_query_async, clear_memory, close_async_app
 from databases.chroma_config import get_chroma_client
 import chromadb
 from loguru import logger
@@ -24,6 +26,9 @@ from tests.evaluation.db_utils import save_results_to_db
 # Load environment variables
 load_dotenv()
 
+# Upper bound on chatbot queries answered at the same time
+EVAL_MAX_CONCURRENCY = int(os.getenv("EVAL_MAX_CONCURRENCY", "10"))
+
 
 def get_test_data() -> Tuple[List[str], List[str]]:
     """Get test questions and expected responses from MySQL database."""
@@ -55,6 +60,40 @@ def get_contexts_from_db(questions: List[str]) -> List[List[str]]:
             
     return contexts
 
+def _format_answer(response) -> str:
+    """Flatten a chatbot response into answer text, with its source if any."""
+    if isinstance(response, dict):
+        answer = response.get("message", "")
+        source = response.get("source", "")
+        if source:
+            answer += f"\nSource: {source}"
+        return answer
+    return str(response)
+
+
+async def generate_answers(
+    questions: List[str], max_concurrent: int = EVAL_MAX_CONCURRENCY
+) -> List[str]:
+    """Answer every question concurrently, each on its own throwaway thread."""
+    semaphore = asyncio.Semaphore(max_concurrent)
+    run_id = uuid.uuid4().hex[:8]
+    thread_ids = [f"eval-{run_id}-{i}" for i in range(len(questions))]
+
+    async def answer(question: str, thread_id: str) -> str:
+        async with semaphore:
+            return _format_answer(await chat_query_async(question, thread_id))
+
+    try:
+        return list(await asyncio.gather(
+            *(answer(question, thread_id) for question, thread_id in zip(questions, thread_ids))
+        ))
+    finally:
+        for thread_id in thread_ids:
+            await asyncio.to_thread(clear_memory, thread_id)
+        # asyncio.run closes this loop next, so release its checkpointer connection
+        await close_async_app()
+
+
 def evaluate_rag_system(
     custom_questions: Optional[list] = None
 ) -> Tuple[Dict, Dict]:
@@ -80,19 +119,7 @@ def evaluate_rag_system(
     contexts = get_contexts_from_db(questions)
     
     # Generate answers using the chatbot
-    answers = []
-    for question in questions:
-        response = chat_query(question)
-        
-        if isinstance(response, dict):
-            answer = response.get("message", "")
-            source = response.get("source", "")
-            if source:
-                answer += f"\nSource: {source}"
-        else:
-            answer = str(response)
-            
-        answers.append(answer)
+    answers = asyncio.run(generate_answers(questions))
     
     # Create dataset for evaluation using HuggingFace datasets
     data = {
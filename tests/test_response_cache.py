@@ -0,0 +1,152 @@
+"""Unit tests for the chatbot response cache."""
+
+import sqlite3
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agents import response_cache
+from agents.response_cache import ResponseCache
+
+# Fixed embeddings so similarity is known exactly
+_VECTORS = {
+    "top 5 campaigns by conversion rate": [1.0, 0.0, 0.0],
+    "show the 5 best campaigns by conversion rate": [0.99, 0.14, 0.0],
+    "show the 10 best campaigns by conversion rate": [0.99, 0.14, 0.0],
+    "what is the weather today": [0.0, 0.0, 1.0],
+}
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(sqlite3.connect(":memory:"), ttl=60,
+                         embed_fn=lambda q: _VECTORS[q], tau=0.90)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() as seen by the cache module."""
+    now = {"t": 1_000_000.0}
+    monkeypatch.setattr(response_cache.time, "time", lambda: now["t"])
+    return now
+
+
+def test_make_key_is_stable():
+    history = [HumanMessage(content="hi"), AIMessage(content="hello")]
+    key = ResponseCache.make_key("gpt", "u1", "t1", "Top campaigns", history)
+    assert key == ResponseCache.make_key("gpt", "u1", "t1", "Top campaigns", list(history))
+    # Case and surrounding whitespace of the query do not matter
+    assert key == ResponseCache.make_key("gpt", "u1", "t1", "  top CAMPAIGNS ", history)
+
+
+@pytest.mark.parametrize("change", [
+    {"model": "other"},
+    {"user_id": "u2"},
+    {"thread_id": "t2"},
+    {"user_query": "Worst campaigns"},
+    {"history": [HumanMessage(content="bye")]},
+])
+def test_make_key_changes_with_context(change):
+    args = {"model": "gpt", "user_id": "u1", "thread_id": "t1",
+            "user_query": "Top campaigns", "history": [HumanMessage(content="hi")]}
+    assert ResponseCache.make_key(**args) != ResponseCache.make_key(**{**args, **change})
+
+
+def test_make_key_ignores_history_beyond_window():
+    recent = [HumanMessage(content=str(i)) for i in range(response_cache.RESPONSE_CACHE_HISTORY)]
+    longer = [HumanMessage(content="old")] + recent
+    assert (ResponseCache.make_key("gpt", "u1", "t1", "q", recent)
+            == ResponseCache.make_key("gpt", "u1", "t1", "q", longer))
+
+
+def test_set_then_get(cache):
+    payload = {"type": "text", "message": "Campaign 101 converted 4.2%"}
+    cache.set("k", payload, thread_id="t1")
+    assert cache.get("k") == payload
+    assert cache.get("missing") is None
+
+
+def test_get_reads_sqlite_when_not_in_memory(cache):
+    cache.set("k", {"message": "stored"}, thread_id="t1")
+    cache._lru.clear()
+    assert cache.get("k") == {"message": "stored"}
+
+
+def test_entries_expire_after_ttl(cache, clock):
+    cache.set("k", {"message": "stored"}, thread_id="t1")
+    clock["t"] += cache.ttl
+    assert cache.get("k") == {"message": "stored"}
+    clock["t"] += 1
+    assert cache.get("k") is None
+    # The SQLite copy has expired as well
+    cache._lru.clear()
+    assert cache.get("k") is None
+
+
+def test_lru_evicts_oldest(cache):
+    cache.maxsize = 2
+    for key in ("a", "b", "c"):
+        cache.set(key, {"message": key})
+    assert list(cache._lru) == ["b", "c"]
+
+
+def test_clear_thread_keeps_other_threads(cache):
+    cache.set("a", {"message": "a"}, thread_id="t1")
+    cache.set("b", {"message": "b"}, thread_id="t2")
+    cache.clear_thread("t1")
+    assert cache.get("a") is None
+    assert cache.get("b") == {"message": "b"}
+
+
+def test_semantic_hit_on_paraphrase(cache):
+    query = "top 5 campaigns by conversion rate"
+    cache.add_similar("u1", "t1", query, cache.embed(query), {"message": "top 5"})
+    paraphrase = "show the 5 best campaigns by conversion rate"
+    assert cache.get_similar("u1", "t1", paraphrase, cache.embed(paraphrase)) == {"message": "top 5"}
+
+
+def test_semantic_miss_below_threshold(cache):
+    query = "top 5 campaigns by conversion rate"
+    cache.add_similar("u1", "t1", query, cache.embed(query), {"message": "top 5"})
+    other = "what is the weather today"
+    assert cache.get_similar("u1", "t1", other, cache.embed(other)) is None
+
+
+def test_semantic_miss_when_numbers_differ(cache):
+    query = "top 5 campaigns by conversion rate"
+    cache.add_similar("u1", "t1", query, cache.embed(query), {"message": "top 5"})
+    paraphrase = "show the 10 best campaigns by conversion rate"
+    assert cache.get_similar("u1", "t1", paraphrase, cache.embed(paraphrase)) is None
+
+
+@pytest.mark.parametrize("follow_up", [
+    "what about its open rate?",
+    "show the same for those campaigns",
+    "and open rate?",
+])
+def test_context_dependent_queries_skip_semantic_cache(cache, follow_up):
+    embedding = cache.embed("top 5 campaigns by conversion rate")
+    cache.add_similar("u1", "t1", follow_up, embedding, {"message": "earlier context"})
+    assert cache.get_similar("u1", "t1", follow_up, embedding) is None
+    # Nothing was stored for a plain query to match either
+    assert cache.get_similar("u1", "t1", "top 5 campaigns by conversion rate", embedding) is None
+
+
+def test_semantic_lookup_is_scoped_to_thread(cache):
+    query = "top 5 campaigns by conversion rate"
+    cache.add_similar("u1", "t1", query, cache.embed(query), {"message": "top 5"})
+    assert cache.get_similar("u1", "t2", query, cache.embed(query)) is None
+    assert cache.get_similar("u2", "t1", query, cache.embed(query)) is None
+
+
+def test_semantic_entries_expire_after_ttl(cache, clock):
+    query = "top 5 campaigns by conversion rate"
+    cache.add_similar("u1", "t1", query, cache.embed(query), {"message": "top 5"})
+    clock["t"] += cache.ttl + 1
+    assert cache.get_similar("u1", "t1", query, cache.embed(query)) is None
+
+
+def test_embed_without_embedder_disables_semantic_lookup():
+    cache = ResponseCache(sqlite3.connect(":memory:"))
+    assert cache.embed("top 5 campaigns by conversion rate") is None
+    assert cache.get_similar("u1", "t1", "q", None) is None
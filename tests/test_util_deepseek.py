@@ -0,0 +1,88 @@
+"""Unit tests for parsing and cleaning Deepseek responses."""
+
+import pytest
+
+from agents.util_deepseek import (
+    clean_deepseek_content, inspect_content, parse_deepseek_tool_calls
+)
+
+
+def _request(payload: str) -> str:
+    return f"[TOOL_REQUEST]{payload}[END_TOOL_REQUEST]"
+
+
+def test_parses_tool_request():
+    content = "Let me check.\n" + _request(
+        '{"name": "get_campaign_by_id", "arguments": {"campaign_id": 101}}'
+    )
+    assert parse_deepseek_tool_calls(content) == [{
+        "id": "call_0_get_campaign_by_id",
+        "name": "get_campaign_by_id",
+        "args": {"campaign_id": 101},
+    }]
+
+
+def test_parses_every_request():
+    content = _request('{"name": "a"}') + " and " + _request('{"name": "b", "arguments": {"x": 1}}')
+    calls = parse_deepseek_tool_calls(content)
+    assert [(c["id"], c["args"]) for c in calls] == [("call_0_a", {}), ("call_1_b", {"x": 1})]
+
+
+@pytest.mark.parametrize("content", [
+    "",
+    "no markers here",
+    '[TOOL_REQUEST]{"name": "a"}',                    # never closed
+    '[END_TOOL_REQUEST]{"name": "a"}[TOOL_REQUEST]',  # closed before opened
+    _request(""),
+    _request('{"name": "a"'),                         # truncated JSON
+    _request("not json"),
+    _request('["a", "b"]'),                           # not an object
+    _request('"a"'),
+    _request('{"arguments": {}}'),                    # no name
+])
+def test_malformed_requests_yield_no_calls(content):
+    assert parse_deepseek_tool_calls(content) == []
+
+
+def test_malformed_request_does_not_hide_later_ones():
+    content = _request("{broken") + _request('{"name": "b"}')
+    assert [c["id"] for c in parse_deepseek_tool_calls(content)] == ["call_1_b"]
+
+
+def test_unclosed_request_after_valid_one():
+    content = _request('{"name": "a"}') + '[TOOL_REQUEST]{"name": "b"}'
+    assert [c["name"] for c in parse_deepseek_tool_calls(content)] == ["a"]
+
+
+
+def test_inspect_content_reports_markers():
+    info = inspect_content("<think>hmm</think> text " + _request('{"name": "a"}'))
+    assert info.has_think and info.has_tool_request and not info.has_tool_result
+    assert info.tool_request_start == len("<think>hmm</think> text ")
+    assert not inspect_content("plain").has_markers
+
+
+def test_parses_from_first_request_offset():
+    content = "<think>plan</think>" + _request('{"name": "a"}') + _request('{"name": "b"}')
+    calls = parse_deepseek_tool_calls(content, inspect_content(content).tool_request_start)
+    assert [c["id"] for c in calls] == ["call_0_a", "call_1_b"]
+
+
+def test_clean_removes_blocks():
+    content = "<think>hmm</think>\n\nAnswer\n\n" + _request('{"name": "a"}') + "[TOOL_RESULT]x[END_TOOL_RESULT]"
+    assert clean_deepseek_content(content) == "Answer"
+
+
+def test_clean_leaves_unmarked_content_untouched():
+    assert clean_deepseek_content("  plain\n\n\ntext ") == "  plain\n\n\ntext "
+
+
+def test_clean_leaves_unclosed_blocks_untouched():
+    content = "<think>never closed\n\nAnswer "
+    assert clean_deepseek_content(content) == content
+
+
+def test_returned_calls_do_not_share_cached_state():
+    content = _request('{"name": "a", "arguments": {"x": 1}}')
+    parse_deepseek_tool_calls(content)[0]["args"]["x"] = 2
+    assert parse_deepseek_tool_calls(content)[0]["args"] == {"x": 1}